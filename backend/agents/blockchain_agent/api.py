@@ -2,10 +2,24 @@ from auth.schemas import User
 from auth.auth import get_user
 from fastapi import APIRouter, Depends
 from agents.blockchain_agent.blockchain import get_balance, payment, mint_nft
+from agents.blockchain_agent.metadata_store import metadata_store
+from responses import StandardException
 
 blockchain_router = APIRouter(prefix='/v1/test', tags=["test"])
+nft_router = APIRouter(prefix='/v1/nft', tags=["nft"])
 
 
 @blockchain_router.get('/test')
 async def test(url: str = None):
-    return str(mint_nft(url))
+    return str(await mint_nft(url))
+
+
+@nft_router.get('/metadata/{digest}')
+async def nft_metadata(digest: str):
+    # Token URIs are content hashes, so anything that isn't one can't exist
+    if len(digest) != 64 or any(c not in '0123456789abcdef' for c in digest):
+        raise StandardException(status_code=404, details='metadata not found', message='metadata not found')
+    metadata = await metadata_store.load(digest)
+    if metadata is None:
+        raise StandardException(status_code=404, details='metadata not found', message='metadata not found')
+    return metadata
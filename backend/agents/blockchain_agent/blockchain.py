@@ -1,17 +1,23 @@
 import os
 import json
+import time
+import hashlib
 import dotenv
 import asyncio  # Import asyncio to run the async main function
-from typing import Optional
-from web3 import Web3
-from brownie import project, network, accounts, Contract
-from brownie.network.account import LocalAccount
-from brownie.network.contract import ProjectContract
+from typing import Optional, TYPE_CHECKING
 from web3 import Web3
 
 from agents.blockchain_agent.schemas import ContractsData
+from agents.blockchain_agent.chain import chain
+from agents.blockchain_agent.tx_pipeline import TxPipeline, get_pipeline
+from agents.blockchain_agent.metadata_store import metadata_store
 from globar_vars import Var
-web3 = Web3(Web3.HTTPProvider("https://bsc-testnet.infura.io/v3/eab9f2aff8984a57ac11c6043cf87d78"))
+
+# brownie is slow to import and connecting it talks to the network, so both
+# happen in init_chain() at startup instead of when this module is imported
+if TYPE_CHECKING:
+    from brownie.network.account import LocalAccount
+    from brownie.network.contract import ProjectContract
 
 # Assuming your DataBase class and ContractsData schema are importable
 # from database import DataBase
@@ -21,7 +27,17 @@ web3 = Web3(Web3.HTTPProvider("https://bsc-testnet.infura.io/v3/eab9f2aff8984a57
 dotenv.load_dotenv()
 
 
-def get_account() -> LocalAccount:
+# Set by init_chain() / start_blockchain_funcs()
+FundMe = SimpleCollectible = None
+account = fundme = simple = None
+# AsyncWeb3 views of the same contracts, and the pipeline that sends from `account`
+fundme_async = simple_async = None
+pipeline: Optional[TxPipeline] = None
+
+
+def get_account() -> "LocalAccount":
+    from brownie import accounts
+
     account = accounts.add(os.environ.get('PRIVATE_KEY'))
     print(account)
     return account
@@ -32,13 +48,36 @@ def get_account() -> LocalAccount:
 
 # --- Main Logic: Initialize Contracts from Database ---
 
+def code_hash(container) -> str:
+    """Identifies the version of a brownie contract (its deployment bytecode)."""
+    return hashlib.sha256(container.bytecode.encode()).hexdigest()[:16]
+
+
+async def load_or_deploy(name: str, container, address: Optional[str], deployed_code: Optional[str],
+                         deploying_account: "LocalAccount") -> "ProjectContract":
+    """The contract at `address` if it was deployed from the current source, else a fresh deployment."""
+    from brownie import Contract
+
+    if address and deployed_code == code_hash(container):
+        print(f"Loading existing {name} contract from DB address: {address}")
+        return Contract.from_abi(name, address, container.abi)
+    if address:
+        # Loading it with the new ABI would offer functions (batch payouts/mints...) it doesn't have
+        print(f"{name} at {address} was deployed from an older version of the contract, redeploying")
+    print(f"Deploying new {name} contract...")
+    contract = await chain.run_sync(container.deploy, {"from": deploying_account})
+    print(f"Deployed {name} to: {contract.address}")
+    return contract
+
+
 async def initialize_contracts_from_db(
-        deploying_account: LocalAccount,
+        deploying_account: "LocalAccount",
         network_name: str
-) -> tuple[ProjectContract, ProjectContract]:
+) -> tuple["ProjectContract", "ProjectContract"]:
     """
-    Loads contracts from addresses stored in the database. If not found,
-    deploys them and saves the new addresses to the DB.
+    Loads contracts from addresses stored in the database. If not found, or
+    deployed from an older version of the contract, deploys them and saves the
+    new addresses to the DB.
     """
     print("\n--- Initializing Contracts from Database ---")
     # Instantiate your database class
@@ -59,27 +98,21 @@ async def initialize_contracts_from_db(
         )
 
     # 2. Check, Deploy, or Load the FundMe contract
-    if contract_data.fund_me:
-        print(f"Loading existing FundMe contract from DB address: {contract_data.fund_me}")
-        fundme_contract = Contract.from_abi("FundMe", contract_data.fund_me, FundMe.abi)
-    else:
-        print("Deploying new FundMe contract...")
-        fundme_contract = FundMe.deploy({"from": deploying_account})
+    fundme_contract = await load_or_deploy("FundMe", FundMe, contract_data.fund_me, contract_data.fund_me_code,
+                                           deploying_account)
+    if fundme_contract.address != contract_data.fund_me:
         contract_data.fund_me = fundme_contract.address
+        contract_data.fund_me_code = code_hash(FundMe)
         needs_db_update = True
-        print(f"Deployed FundMe to: {fundme_contract.address}")
 
     # 3. Check, Deploy, or Load the SimpleCollectible contract
-    if contract_data.simplecol:
-        print(f"Loading existing SimpleCollectible contract from DB address: {contract_data.simplecol}")
-        simple_collectible_contract = Contract.from_abi("SimpleCollectible", contract_data.simplecol,
-                                                        SimpleCollectible.abi)
-    else:
-        print("Deploying new SimpleCollectible contract...")
-        simple_collectible_contract = SimpleCollectible.deploy({"from": deploying_account})
+    simple_collectible_contract = await load_or_deploy("SimpleCollectible", SimpleCollectible,
+                                                       contract_data.simplecol, contract_data.simplecol_code,
+                                                       deploying_account)
+    if simple_collectible_contract.address != contract_data.simplecol:
         contract_data.simplecol = simple_collectible_contract.address
+        contract_data.simplecol_code = code_hash(SimpleCollectible)
         needs_db_update = True
-        print(f"Deployed SimpleCollectible to: {simple_collectible_contract.address}")
 
     # 4. If any new contracts were deployed, update the database
     if needs_db_update:
@@ -91,38 +124,65 @@ async def initialize_contracts_from_db(
     return fundme_contract, simple_collectible_contract
 
 
-def payment(to_addr: str, amount: float) -> str:
-    """Sends funds through the FundMe contract."""
-    if not fundme or not account:
+def tx_hash(receipt) -> str:
+    return Web3.to_hex(receipt["transactionHash"])
+
+
+async def payment(to_addr: str, amount: float) -> str:
+    """Sends funds to `to_addr` in one transaction (or via fund + transferFunds with PAYMENT_MODE=legacy)."""
+    if not fundme_async or not pipeline:
         return "Error: Contracts are not initialized."
     try:
         to_addr_checksum = Web3.to_checksum_address(to_addr)
-        # Fund the contract first
-        tx_fund = fundme.fund({"from": account, "value": Web3.to_wei(amount, "ether")})
-        tx_fund.wait(1)
-        # Transfer from the contract to the destination
-        tx_transfer = fundme.transferFunds(account, to_addr_checksum, Web3.to_wei(amount, "ether"), {"from": account})
-        tx_transfer.wait(1)
-        return f"Payment of {amount} BNB transferred successfully to {to_addr}. Tx: {tx_transfer.txid}"
+        amount_wei = Web3.to_wei(amount, "ether")
+        if Var.PAYMENT_MODE == 'direct':
+            # A plain value transfer is the cheapest payment there is
+            receipt = await pipeline.send({"to": to_addr_checksum, "value": amount_wei, "gas": 21000})
+        elif Var.PAYMENT_MODE == 'contract':
+            receipt = await pipeline.call(fundme_async.functions.fundAndTransfer(to_addr_checksum), value=amount_wei)
+        else:
+            # Fund the contract first
+            await pipeline.call(fundme_async.functions.fund(), value=amount_wei)
+            # Transfer from the contract to the destination
+            receipt = await pipeline.call(fundme_async.functions.transferFunds(pipeline.address, to_addr_checksum,
+                                                                               amount_wei))
+        return f"Payment of {amount} BNB transferred successfully to {to_addr}. Tx: {tx_hash(receipt)}"
     except Exception as e:
         return f"Error during payment: {e}"
 
 
-def get_balance() -> str:
+async def batch_payment(payouts: list[tuple[str, float]]) -> str:
+    """Pays every (address, amount) pair in a single FundMe.batchPayout transaction."""
+    if not fundme_async or not pipeline:
+        return "Error: Contracts are not initialized."
+    if not payouts:
+        return "Error: No payouts given."
+    try:
+        recipients = [Web3.to_checksum_address(to_addr) for to_addr, _ in payouts]
+        amounts = [Web3.to_wei(amount, "ether") for _, amount in payouts]
+        receipt = await pipeline.call(fundme_async.functions.batchPayout(recipients, amounts), value=sum(amounts))
+        total = Web3.from_wei(sum(amounts), "ether")
+        return (f"Paid {len(payouts)} recipients {total} BNB in total. Tx: {tx_hash(receipt)}, "
+                f"gas used: {receipt['gasUsed']}")
+    except Exception as e:
+        return f"Error during batch payment: {e}"
+
+
+async def get_balance() -> str:
     """Gets the balance of the loaded account from the chain."""
     if not account:
         return "Error: Account is not initialized."
     try:
-        balance_wei = web3.eth.get_balance(account.address)
+        balance_wei = await chain.get_balance(account.address)
         balance_ether = Web3.from_wei(balance_wei, "ether")
         return f"Account balance for {account.address} is: {balance_ether} BNB"
     except Exception as e:
         return f"Error getting balance: {e}"
 
 
-def mint_nft(image_url: str) -> str:
+async def mint_nft(image_url: str) -> str:
     """Mints an NFT with the given image URL."""
-    if not simple or not account:
+    if not simple_async or not pipeline:
         return "Error: Contracts are not initialized."
     try:
         uri = {
@@ -132,42 +192,78 @@ def mint_nft(image_url: str) -> str:
             "attributes": []
         }
         json_uri = json.dumps(uri)
-        tx = simple.createCollectible(json_uri, account, {"from": account})
-        tx.wait(1)
-        return f"Successfully minted NFT! Transaction hash: {tx.txid}"
+        receipt = await pipeline.call(simple_async.functions.createCollectible(json_uri, pipeline.address))
+        return f"Successfully minted NFT! Transaction hash: {tx_hash(receipt)}"
     except Exception as e:
         return f"Error minting NFT: {e}"
 
 
+async def batch_mint_nfts(image_urls: list[str]) -> str:
+    """Mints one NFT per image URL in a single transaction, with the metadata stored off-chain by hash."""
+    if not simple_async or not pipeline:
+        return "Error: Contracts are not initialized."
+    if not image_urls:
+        return "Error: No image URLs given."
+    try:
+        started = time.perf_counter()
+        hashes = []
+        for image_url in image_urls:
+            digest = await metadata_store.save({
+                "name": "BNB Hackathon NFT",
+                "description": "An NFT minted via a custom script.",
+                "image": image_url,
+                "attributes": []
+            })
+            hashes.append(bytes.fromhex(digest))
+        receipt = await pipeline.call(simple_async.functions.createCollectibles(pipeline.address, hashes))
+        elapsed = time.perf_counter() - started
+        token_ids = [event["args"]["tokenId"] for event in simple_async.events.Transfer().process_receipt(receipt)]
+        gas_used = receipt["gasUsed"]
+        return (f"Minted {len(token_ids)} NFTs (token ids {token_ids[0]}-{token_ids[-1]}) in one transaction "
+                f"{tx_hash(receipt)}. Gas used: {gas_used} ({gas_used // len(hashes)} per NFT), "
+                f"took {elapsed:.1f}s")
+    except Exception as e:
+        return f"Error minting NFTs: {e}"
+
+
+async def ensure_metadata_base_uri():
+    """Points the collection's metadataBaseURI at our metadata route, if it isn't already."""
+    base_url = metadata_store.base_url()
+    try:
+        if await simple_async.functions.metadataBaseURI().call() != base_url:
+            await pipeline.call(simple_async.functions.setMetadataBaseURI(base_url))
+    except Exception as e:
+        print(f"Could not set the NFT metadata base URI: {e}")
+
+
 # --- Running the Async Initialization ---
 
+def init_chain():
+    """Loads the brownie project and connects to the network (blocking, so run it off the event loop)."""
+    global FundMe, SimpleCollectible, account
+    from brownie import project, network
+
+    p = project.load('agents/blockchain_agent/brown')
+    network.connect('bsc-testnet')
+    FundMe = p.FundMe
+    SimpleCollectible = p.SimpleCollectible
+    account = get_account()
+
+
 async def start_blockchain_funcs():
     """Main async function to setup and run the application logic."""
-    # Your existing setup logic
-    account = get_account()
+    from brownie import network
+
+    await asyncio.to_thread(init_chain)
     network_name = network.show_active()
 
     # Initialize contracts using the new DB-driven function
-    global fundme, simple
+    global fundme, simple, fundme_async, simple_async, pipeline
     fundme, simple = await initialize_contracts_from_db(account, network_name)
 
-    # You can now call your other functions as normal
-    # Example:
-    # balance = get_balance()
-    # print(balance)
-
-#
-p = project.load('agents/blockchain_agent/brown')
-network.connect('bsc-testnet')
-FundMe = p.FundMe
-SimpleCollectible = p.SimpleCollectible
-account = get_account()
-# # Run the main async function
-# asyncio.run(main())
-#
-# account = get_account()
-#     network_name = network.show_active()
-#
-#     # Initialize contracts using the new DB-driven function
-# global fundme, simple
-# fundme, simple = await initialize_contracts_from_db(account, network_name)
+    # Transactions are signed locally and sent through the account's pipeline
+    w3 = await chain.w3()
+    fundme_async = w3.eth.contract(address=fundme.address, abi=FundMe.abi)
+    simple_async = w3.eth.contract(address=simple.address, abi=SimpleCollectible.abi)
+    pipeline = get_pipeline(os.environ.get('PRIVATE_KEY'))
+    await ensure_metadata_base_uri()
@@ -2,21 +2,17 @@ import os
 
 from langchain.agents import create_structured_chat_agent
 from langchain.agents.agent import AgentExecutor
-from langsmith import Client
+from agents.prompt_registry import get_prompt
 from langchain_core.tools import StructuredTool
 from langchain_core.runnables import chain
 from langgraph.graph import StateGraph, END
-from agents.blockchain_agent.blockchain import get_balance, payment, mint_nft
-from langchain_google_genai import ChatGoogleGenerativeAI
+from agents.blockchain_agent.blockchain import get_balance, payment, batch_payment, mint_nft, batch_mint_nfts
+from agents.blockchain_agent.chain import chain as chain_client
 from web3 import Web3
 from pydantic import BaseModel
-from agents.blockchain_agent.schemas import AgentState, TransferInput, NoInput, NftInput
+from agents.blockchain_agent.schemas import AgentState, TransferInput, BatchTransferInput, NoInput, NftInput, BatchNftInput
 from agents.llm import get_llm
 
-prompt = Client().pull_prompt("hwchase17/structured-chat-agent", include_model=True)
-web3 = Web3(Web3.HTTPProvider("https://bsc-testnet.infura.io/v3/eab9f2aff8984a57ac11c6043cf87d78"))
-
-
 
 class BlockchainAgent:
     def __init__(self, creds: dict):
@@ -29,36 +25,58 @@ class BlockchainAgent:
         creds = creds2
         self.wallet = creds.get("wallet") or os.environ.get('WALLET')
         self.private_key = creds.get("private_key") or os.environ.get('PRIVATE_KEY')
-        self.agent = self.get_agent()
+        # Compiled lazily by get_agent() once the tools are known
+        self.agent = None
+        self._agent_tools = None
         self.struct_tools = self.StructTools(self)
 
+    # Attribute names on StructTools that a workflow node may enable
+    tool_funcs = ('get_balance', 'transfer', 'batch_transfer', 'mint_nft', 'batch_mint_nft')
+
     class StructTools:
         def __init__(self, other_self):
             self.get_balance = StructuredTool.from_function(
                 name="get_balance",
-                func=other_self.get_balance,
+                coroutine=other_self.get_balance,
                 description="Get the balance of a wallet",
                 args_schema=NoInput
             )
             self.transfer = StructuredTool.from_function(
                 name="transfer",
-                func=other_self.transfer,
+                coroutine=other_self.transfer,
                 description="Transfer Crypto from one wallet to another",
                 args_schema=TransferInput
             )
+            self.batch_transfer = StructuredTool.from_function(
+                name="batch_transfer",
+                coroutine=other_self.batch_transfer,
+                description="Pay several wallets at once in a single transaction",
+                args_schema=BatchTransferInput
+            )
             self.mint_nft = StructuredTool.from_function(
                 name="mint_nft",
-                func=other_self.mint_nft,
+                coroutine=other_self.mint_nft,
                 description="for Minting an NFT with url and gives the nft transaction hash",
                 args_schema=NftInput
             )
+            self.batch_mint_nft = StructuredTool.from_function(
+                name="batch_mint_nft",
+                coroutine=other_self.batch_mint_nft,
+                description="for Minting many NFTs at once, one per url, in a single transaction",
+                args_schema=BatchNftInput
+            )
 
     def get_agent(self):
 
+        # Reuse the compiled graph until the tool list changes
+        tools_key = tuple(map(id, self.tools))
+        if self.agent is not None and self._agent_tools == tools_key:
+            return self.agent
+
         agent = create_structured_chat_agent(
             llm=self.llm,
             tools=self.tools,
-            prompt=prompt,
+            prompt=get_prompt(),
         )
 
         agent_executor = AgentExecutor.from_agent_and_tools(
@@ -71,6 +89,7 @@ class BlockchainAgent:
         # Create LangGraph workflow
         workflow = self.create_workflow(agent_executor)
         self.agent = workflow
+        self._agent_tools = tools_key
         return workflow
 
 
@@ -79,17 +98,27 @@ class BlockchainAgent:
         print(type(search_list), search_list)
         return "yoyoyo"
 
-    def get_balance(self):
-        balance_wei = web3.eth.get_balance(self.wallet)
-        return  "Your balance in ether is: " + str(web3.from_wei(balance_wei, "ether"))
+    async def get_balance(self):
+        balance_wei = await chain_client.get_balance(self.wallet)
+        return  "Your balance in ether is: " + str(Web3.from_wei(balance_wei, "ether"))
+
+    @staticmethod
+    async def transfer(to: str, amount):
+        return  await payment(to, float(amount))
+
+    @staticmethod
+    async def batch_transfer(payouts: list):
+        # Depending on the langchain version these arrive as models or as plain dicts
+        payouts = [payout if isinstance(payout, dict) else payout.model_dump() for payout in payouts]
+        return  await batch_payment([(payout["to"], float(payout["amount"])) for payout in payouts])
 
     @staticmethod
-    def transfer(to: str, amount):
-        return  payment(to, float(amount))
+    async def mint_nft(url: str):
+        return  await mint_nft(url)
 
     @staticmethod
-    def mint_nft(url: str):
-        return  mint_nft(url)
+    async def batch_mint_nft(urls: list[str]):
+        return  await batch_mint_nfts(urls)
 
     @staticmethod
     def create_workflow(agent_executor):
@@ -122,10 +151,11 @@ class BlockchainAgent:
     # noinspection PyTypeChecker
     async def run(self, query: str):
         result = None
+        # Retries only re-invoke the compiled graph
+        agent = self.get_agent()
         for i in range(3):
             try:
-                self.agent = self.get_agent()
-                result = await self.agent.ainvoke({
+                result = await agent.ainvoke({
                     "question": query,
                     "response": None
                 })
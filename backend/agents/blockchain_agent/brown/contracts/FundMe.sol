@@ -11,6 +11,8 @@ contract FundMe {
     address public owner;
     address[] public funders;
 
+    event Payout(address indexed from, address indexed to, uint256 amount);
+
     constructor() public {
         owner = msg.sender;
     }
@@ -44,6 +46,30 @@ contract FundMe {
         to.transfer(amount);
     }
 
+    /// @notice Pay `to` the attached value in one transaction (fund + transferFunds combined)
+    /// @param to The recipient address
+    function fundAndTransfer(address payable to) public payable {
+        require(msg.value >= 1e14, "Minimum ETH not met");
+        to.transfer(msg.value);
+        emit Payout(msg.sender, to, msg.value);
+    }
+
+    /// @notice Pay many recipients in one transaction; the attached value must equal the sum of `amounts`
+    /// @param recipients The recipient addresses
+    /// @param amounts The amount for each recipient (in wei)
+    function batchPayout(address payable[] memory recipients, uint256[] memory amounts) public payable {
+        require(recipients.length == amounts.length, "Length mismatch");
+        uint256 total = 0;
+        for (uint256 i = 0; i < amounts.length; i++) {
+            total = total.add(amounts[i]);
+        }
+        require(msg.value == total, "Value does not match total");
+        for (uint256 i = 0; i < recipients.length; i++) {
+            recipients[i].transfer(amounts[i]);
+            emit Payout(msg.sender, recipients[i], amounts[i]);
+        }
+    }
+
     /// @notice Allow contract owner to withdraw all funds
     function withdrawAll() public {
         require(msg.sender == owner, "Only owner can withdraw");
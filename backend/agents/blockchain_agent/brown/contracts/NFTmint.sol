@@ -1,4 +1,3 @@
-
 // SPDX-License-Identifier: MIT
 pragma solidity 0.6.6;
 
@@ -6,9 +5,17 @@ import "@openzeppelin/contracts/token/ERC721/ERC721.sol";
 
 contract SimpleCollectible is ERC721 {
     uint256 public tokenCounter;
+    address public owner;
+
+    /// @notice SHA-256 of the off-chain metadata JSON of tokens minted in batches
+    mapping(uint256 => bytes32) public metadataHash;
+    /// @notice Prefix of batch-minted token URIs. Kept apart from ERC721's baseURI,
+    /// which would also be prepended to the full URIs stored by createCollectible
+    string public metadataBaseURI;
 
     constructor() public ERC721("NFT", "NFT Collection") {
         tokenCounter = 0;
+        owner = msg.sender;
     }
 
     function createCollectible(
@@ -21,4 +28,43 @@ contract SimpleCollectible is ERC721 {
         tokenCounter = tokenCounter + 1;
         return newTokenId;
     }
+
+    /// @notice Mint one token per metadata hash to `recipient` in a single transaction
+    /// @param recipient The owner of the new tokens
+    /// @param hashes SHA-256 of each token's metadata JSON, served under metadataBaseURI
+    /// @return firstTokenId The id of the first token; the rest follow consecutively
+    function createCollectibles(address recipient, bytes32[] memory hashes) public returns (uint256 firstTokenId) {
+        firstTokenId = tokenCounter;
+        for (uint256 i = 0; i < hashes.length; i++) {
+            // Only the 32-byte hash is stored; tokenURI() derives the URL from it
+            metadataHash[firstTokenId + i] = hashes[i];
+            _safeMint(recipient, firstTokenId + i);
+        }
+        tokenCounter = firstTokenId + hashes.length;
+    }
+
+    /// @notice Where batch-minted metadata is served from, e.g. https://host/v1/nft/metadata/
+    function setMetadataBaseURI(string memory baseURI_) public {
+        require(msg.sender == owner, "Only owner can set the base URI");
+        metadataBaseURI = baseURI_;
+    }
+
+    function tokenURI(uint256 tokenId) public view override returns (string memory) {
+        bytes32 hash = metadataHash[tokenId];
+        if (hash == bytes32(0)) {
+            return super.tokenURI(tokenId);
+        }
+        require(_exists(tokenId), "ERC721Metadata: URI query for nonexistent token");
+        return string(abi.encodePacked(metadataBaseURI, _toHex(hash)));
+    }
+
+    function _toHex(bytes32 data) internal pure returns (string memory) {
+        bytes memory alphabet = "0123456789abcdef";
+        bytes memory str = new bytes(64);
+        for (uint256 i = 0; i < 32; i++) {
+            str[i * 2] = alphabet[uint8(data[i] >> 4)];
+            str[i * 2 + 1] = alphabet[uint8(data[i] & 0x0f)];
+        }
+        return string(str);
+    }
 }
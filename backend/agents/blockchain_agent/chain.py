@@ -0,0 +1,64 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from web3 import AsyncWeb3
+
+from globar_vars import Var
+from utils.http import get_http_session
+
+
+class ChainClient:
+    """Non-blocking access to the chain for the agent tools.
+
+    Reads and receipt polling go through AsyncWeb3 on the shared aiohttp
+    session. Calls that only exist synchronously (brownie contract
+    transactions) run on a small dedicated thread pool, so a slow RPC or a
+    block wait never holds up the event loop and many operations can overlap.
+    """
+
+    def __init__(self, rpc_url: str, workers: int = 8, receipt_timeout: float = 180, poll_interval: float = 1.0):
+        self.rpc_url = rpc_url
+        self.receipt_timeout = receipt_timeout
+        self.poll_interval = poll_interval
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chain')
+        self._w3: Optional[AsyncWeb3] = None
+        self._session = None
+
+    async def w3(self) -> AsyncWeb3:
+        session = get_http_session()
+        if self._w3 is None or self._session is not session:
+            provider = AsyncWeb3.AsyncHTTPProvider(self.rpc_url)
+            # Reuse the process-wide connection pool instead of a session per provider
+            await provider.cache_async_session(session)
+            self._w3 = AsyncWeb3(provider)
+            self._session = session
+        return self._w3
+
+    async def run_sync(self, fn, *args, **kwargs):
+        """Runs a blocking chain call (e.g. a brownie transaction) on the chain thread pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    async def get_balance(self, address: str) -> int:
+        w3 = await self.w3()
+        return await w3.eth.get_balance(AsyncWeb3.to_checksum_address(address))
+
+    async def wait_for_receipt(self, tx_hash: str, timeout: float = None):
+        """Resolves once the transaction is mined; other coroutines keep running meanwhile."""
+        w3 = await self.w3()
+        return await w3.eth.wait_for_transaction_receipt(
+            tx_hash,
+            timeout=timeout or self.receipt_timeout,
+            poll_latency=self.poll_interval,
+        )
+
+    def receipt_future(self, tx_hash: str) -> asyncio.Task:
+        """Receipt wait as a task, for callers that want to fire several transactions and gather them."""
+        return asyncio.ensure_future(self.wait_for_receipt(tx_hash))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+chain = ChainClient(Var.BSC_RPC_URL, workers=Var.CHAIN_WORKERS)
@@ -0,0 +1,56 @@
+import os
+import json
+import asyncio
+import hashlib
+from typing import Optional
+
+from globar_vars import Var
+from utils.files import atomic_write
+
+
+class MetadataStore:
+    """Content-addressed NFT metadata JSON files under `directory`.
+
+    Each document is stored under the SHA-256 of its canonical JSON, which is
+    also what SimpleCollectible.createCollectibles keeps on-chain, so a token's
+    URI is `base_url + hash` and the contract never stores the JSON itself.
+    """
+
+    def __init__(self, directory: str = 'nft_metadata'):
+        self.directory = directory
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, f'{digest}.json')
+
+    @staticmethod
+    def canonical(metadata: dict) -> bytes:
+        return json.dumps(metadata, sort_keys=True, separators=(',', ':')).encode()
+
+    def _save(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            atomic_write(path, lambda f: f.write(data))
+        return digest
+
+    async def save(self, metadata: dict) -> str:
+        """Stores a metadata document and returns its hex SHA-256."""
+        return await asyncio.to_thread(self._save, self.canonical(metadata))
+
+    def _load(self, digest: str) -> Optional[dict]:
+        try:
+            with open(self.path(digest)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    async def load(self, digest: str) -> Optional[dict]:
+        return await asyncio.to_thread(self._load, digest)
+
+    @staticmethod
+    def base_url() -> str:
+        return f"{Var.BASE_URL}/v1/nft/metadata/"
+
+
+metadata_store = MetadataStore()
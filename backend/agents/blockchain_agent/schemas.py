@@ -14,10 +14,23 @@ class TransferInput(BaseModel):
     amount: float = Field(..., description="The amount to transfer in eth")
 
 
+class Payout(BaseModel):
+    to: str = Field(..., description="The address to pay")
+    amount: float = Field(..., description="The amount to pay in eth")
+
+
+class BatchTransferInput(BaseModel):
+    payouts: List[Payout] = Field(..., description="Every recipient with the amount to pay them")
+
+
 class NftInput(BaseModel):
     url: str = Field(..., description="The url of the nft")
 
 
+class BatchNftInput(BaseModel):
+    urls: List[str] = Field(..., description="The image urls, one NFT is minted per url")
+
+
 class NoInput(BaseModel):
     pass
 
@@ -28,3 +41,6 @@ class ContractsData(BaseModel):
     network: str
     fund_me: str = None
     simplecol: str = None
+    # Hash of the bytecode each address was deployed from; a changed contract is redeployed
+    fund_me_code: str = None
+    simplecol_code: str = None
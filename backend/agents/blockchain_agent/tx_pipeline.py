@@ -0,0 +1,121 @@
+import time
+import asyncio
+from typing import Optional
+
+from eth_account import Account
+from web3.exceptions import TimeExhausted
+
+from agents.blockchain_agent.chain import ChainClient, chain
+from globar_vars import Var
+
+# Headroom over the node's gas estimate
+GAS_MARGIN = 1.2
+
+
+class TxPipeline:
+    """Signs and broadcasts the transactions of one sending account.
+
+    Nonces are handed out locally under a lock, so concurrent payments and
+    mints get consecutive nonces and are broadcast in nonce order without
+    asking the node each time. Up to `max_in_flight` transactions may wait for
+    their receipts at once; receipts are awaited outside the lock so they
+    overlap. After a failed broadcast or a receipt timeout the local nonce is
+    dropped and re-read from the node's pending count on the next send.
+    """
+
+    def __init__(self, client: ChainClient, private_key: str, max_in_flight: int = 8):
+        self.chain = client
+        self.account = Account.from_key(private_key)
+        self.address = self.account.address
+        self._nonce: Optional[int] = None
+        self._lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._chain_id: Optional[int] = None
+        self._gas_price: Optional[tuple[float, int]] = None
+        self.stats = {'sent': 0, 'confirmed': 0, 'reverted': 0, 'resyncs': 0}
+
+    async def chain_id(self) -> int:
+        if self._chain_id is None:
+            w3 = await self.chain.w3()
+            self._chain_id = await w3.eth.chain_id
+        return self._chain_id
+
+    async def gas_price(self) -> int:
+        # Re-read at most every few seconds; a burst of sends shares one lookup
+        if self._gas_price is None or self._gas_price[0] + 5 < time.monotonic():
+            w3 = await self.chain.w3()
+            self._gas_price = (time.monotonic(), await w3.eth.gas_price)
+        return self._gas_price[1]
+
+    async def _broadcast(self, tx: dict) -> str:
+        w3 = await self.chain.w3()
+        async with self._lock:
+            if self._nonce is None:
+                self._nonce = await w3.eth.get_transaction_count(self.address, 'pending')
+            signed = self.account.sign_transaction({**tx, 'nonce': self._nonce})
+            raw = getattr(signed, 'raw_transaction', None) or signed.rawTransaction
+            try:
+                tx_hash = await w3.eth.send_raw_transaction(raw)
+            except Exception:
+                # The node may or may not have taken the nonce; ask it again next time
+                self._nonce = None
+                self.stats['resyncs'] += 1
+                raise
+            self._nonce += 1
+            self.stats['sent'] += 1
+            return tx_hash.hex() if isinstance(tx_hash, bytes) else str(tx_hash)
+
+    async def send(self, tx: dict) -> dict:
+        """Sends a transaction (to/value/data/gas...) and returns its receipt."""
+        tx = {
+            'from': self.address,
+            'chainId': await self.chain_id(),
+            'gasPrice': await self.gas_price(),
+            **tx,
+        }
+        if 'gas' not in tx:
+            w3 = await self.chain.w3()
+            tx['gas'] = int(await w3.eth.estimate_gas(tx) * GAS_MARGIN)
+
+        async with self._in_flight:
+            tx_hash = await self._broadcast(tx)
+            try:
+                receipt = await self.chain.wait_for_receipt(tx_hash)
+            except (TimeExhausted, asyncio.TimeoutError):
+                # Not mined in time; it may still be pending or have been dropped, so re-read the nonce
+                self._nonce = None
+                self.stats['resyncs'] += 1
+                raise
+        if receipt['status'] != 1:
+            self.stats['reverted'] += 1
+            raise RuntimeError(f"transaction {tx_hash} reverted")
+        self.stats['confirmed'] += 1
+        return receipt
+
+    async def call(self, contract_fn, value: int = 0, gas: int = None) -> dict:
+        """Sends a contract function call (an AsyncWeb3 ContractFunction with its arguments bound)."""
+        params = {'from': self.address, 'value': value}
+        if gas is None:
+            gas = int(await contract_fn.estimate_gas(params) * GAS_MARGIN)
+        tx = await contract_fn.build_transaction({
+            **params,
+            'gas': gas,
+            'gasPrice': await self.gas_price(),
+            'chainId': await self.chain_id(),
+            # Placeholder so web3 doesn't look one up; the real nonce is set on broadcast
+            'nonce': 0,
+        })
+        tx.pop('nonce', None)
+        return await self.send(tx)
+
+
+_pipelines = {}
+
+
+def get_pipeline(private_key: str) -> TxPipeline:
+    """The pipeline of the account behind `private_key`; every sender of that account must share it."""
+    address = Account.from_key(private_key).address
+    pipeline = _pipelines.get(address)
+    if pipeline is None:
+        pipeline = _pipelines[address] = TxPipeline(chain, private_key, max_in_flight=Var.TX_MAX_IN_FLIGHT)
+    return pipeline
@@ -1,7 +1,7 @@
 import random
 from langchain.agents import create_structured_chat_agent
 from langchain.agents.agent import AgentExecutor
-from langsmith import Client
+from agents.prompt_registry import get_prompt
 from langchain_core.tools import StructuredTool
 from langchain_core.runnables import chain
 from langgraph.graph import StateGraph, END
@@ -15,8 +15,6 @@ from pydantic import BaseModel
 from langchain.schema.messages import HumanMessage, AIMessage
 
 
-prompt = Client().pull_prompt("hwchase17/structured-chat-agent", include_model=True)
-
 class ConvAgent:
     def __init__(self, cred: dict):
         self.llm = get_llm()
@@ -25,7 +23,9 @@ class ConvAgent:
         self.rag = TextRAG(membase_account="sarathc", rag_input = self.rag_input)
         self.wallet = cred.get("wallet")
         self.private_key = cred.get("private_key")
-        self.agent = self.get_agent()
+        # Compiled lazily by get_agent() once the tools are known
+        self.agent = None
+        self._agent_tools = None
         self.struct_tools = self.StructTools(self)
         self.memory = BufferedMemory(membase_account="0x6BF61cc9cC3F71eF7aBA7A82d132E4584EEe81A1",
                         auto_upload_to_hub=False)
@@ -41,10 +41,15 @@ class ConvAgent:
 
     def get_agent(self):
 
+        # Reuse the compiled graph until the tool list changes
+        tools_key = tuple(map(id, self.tools))
+        if self.agent is not None and self._agent_tools == tools_key:
+            return self.agent
+
         agent = create_structured_chat_agent(
             llm=self.llm,
             tools=self.tools,
-            prompt=prompt,
+            prompt=get_prompt(),
         )
 
         agent_executor = AgentExecutor.from_agent_and_tools(
@@ -57,6 +62,7 @@ class ConvAgent:
         # Create LangGraph workflow
         workflow = self.create_workflow(agent_executor)
         self.agent = workflow
+        self._agent_tools = tools_key
         return workflow
 
 
@@ -109,10 +115,11 @@ class ConvAgent:
                 chat_history.append(HumanMessage(content=msg.content))
             elif msg.role == "assistant":
                 chat_history.append(AIMessage(content=msg.content))
+        # Retries only re-invoke the compiled graph
+        agent = self.get_agent()
         for i in range(3):
             try:
-                self.agent = self.get_agent()
-                result = await self.agent.ainvoke({
+                result = await agent.ainvoke({
                     "question": query,
                     "response": None,
                     "messages": chat_history
@@ -0,0 +1,106 @@
+import os
+import mimetypes
+from typing import Optional
+
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import StreamingResponse
+
+from responses import StandardException
+from agents.image_agent.image_store import image_store
+from agents.image_agent.image_cache import image_cache
+
+image_router = APIRouter(prefix='/v1/images', tags=["images"])
+# Replaces the StaticFiles mount so the /images URLs handed out stay the same
+image_files_router = APIRouter(prefix='/images', tags=["images"])
+
+CHUNK_SIZE = 64 * 1024
+
+
+@image_router.get('/metrics')
+async def image_metrics():
+    return image_cache.metrics()
+
+
+def _parse_range(header: str, size: int) -> Optional[tuple[int, int]]:
+    """(start, end) inclusive for a single `bytes=` range, or None to serve the whole file.
+
+    An unsatisfiable range comes back with start >= size so the caller can answer 416.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        # Multiple ranges may be answered with the full body
+        return None
+    start, _, end = spec.strip().partition('-')
+    try:
+        if not start:
+            length = int(end)
+            return (max(size - length, 0), size - 1) if length > 0 else (size, size)
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    return (start, end) if start <= end else (size, size)
+
+
+def _iter_file(path: str, start: int, length: int):
+    # Sync generator: Starlette iterates it in the thread pool
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    return header.strip() == '*' or etag in [tag.strip().removeprefix('W/') for tag in header.split(',')]
+
+
+@image_files_router.api_route('/{filename}', methods=['GET', 'HEAD'])
+async def serve_image(filename: str, request: Request, w: Optional[int] = None, format: Optional[str] = None):
+    """Serves a stored image (or a resized/re-encoded variant) with strong ETags, conditional GETs and ranges."""
+    path = image_store.path(filename)
+    if os.path.basename(filename) != filename or filename.startswith('.') or not os.path.isfile(path):
+        raise StandardException(status_code=404, details='image not found', message='image not found')
+
+    if w or format:
+        try:
+            path = await image_store.variant(filename, w, format)
+        except ImportError:
+            # Pillow isn't installed: fall back to the original
+            pass
+
+    etag = await image_store.etag(path)
+    headers = {
+        'ETag': etag,
+        'Accept-Ranges': 'bytes',
+        # Stored images never change under the same name
+        'Cache-Control': 'public, max-age=31536000, immutable',
+    }
+    if _etag_matches(request.headers.get('if-none-match', ''), etag):
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(path)
+    media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    byte_range = None
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (not if_range or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range and byte_range[0] >= size:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    headers['Content-Length'] = str(length)
+    status_code = 200
+    if byte_range:
+        status_code = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+    if request.method == 'HEAD':
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(_iter_file(path, start, length), status_code=status_code, headers=headers,
+                             media_type=media_type)
@@ -1,20 +1,22 @@
-import base64
+import json
+import asyncio
 
-import aiohttp
 from langchain.agents import create_structured_chat_agent
 from langchain.agents.agent import AgentExecutor
-from langsmith import Client
+from agents.prompt_registry import get_prompt
 from langchain_core.tools import StructuredTool
 from langchain_core.runnables import chain
 from langgraph.graph import StateGraph, END
 from agents.blockchain_agent.schemas import AgentState
 from agents.image_agent.schemas import ImagePrompt
-from agents.llm import get_llm, get_api_key
-from globar_vars import Var
+from agents.image_agent.image_store import image_store
+from agents.image_agent.image_cache import image_cache
+from agents.llm import get_llm, get_router
 from responses import StandardException
-from utils.tokenizer import invoke_uid
+from utils.singleflight import SingleFlight
+from utils.http import get_http_session
 
-prompt = Client().pull_prompt("hwchase17/structured-chat-agent", include_model=True)
+image_requests = SingleFlight()
 
 
 class ImageAgent:
@@ -22,7 +24,14 @@ class ImageAgent:
         self.llm = get_llm()
         self.tools = []
         self.struct_tools = self.StructTools(self)
-        self.agent = self.get_agent()
+        # Compiled lazily by get_agent() once the tools are known
+        self.agent = None
+        self._agent_tools = None
+
+    # Attribute names on StructTools that a workflow node may enable
+    tool_funcs = ('generate_image',)
+    # Runs have no side effects beyond generating an image, so identical concurrent runs may share one
+    dedupe_runs = True
 
     class StructTools:
         def __init__(self, other_self):
@@ -34,10 +43,15 @@ class ImageAgent:
             )
 
     def get_agent(self):
+        # Reuse the compiled graph until the tool list changes
+        tools_key = tuple(map(id, self.tools))
+        if self.agent is not None and self._agent_tools == tools_key:
+            return self.agent
+
         agent = create_structured_chat_agent(
             llm=self.llm,
             tools=self.tools,
-            prompt=prompt,
+            prompt=get_prompt(),
         )
 
         agent_executor = AgentExecutor.from_agent_and_tools(
@@ -50,6 +64,7 @@ class ImageAgent:
         # Create LangGraph workflow
         workflow = self.create_workflow(agent_executor)
         self.agent = workflow
+        self._agent_tools = tools_key
         return workflow
 
     @staticmethod
@@ -59,11 +74,24 @@ class ImageAgent:
 
     @staticmethod
     async def generate_image(prompt: str) -> str:
+        # Prompts we've already drawn are answered from disk
+        img_filename = await image_cache.get(prompt)
+        if img_filename:
+            return ImageAgent._image_reply(prompt, img_filename)
+        # Concurrent requests for the same prompt share one generation call
+        return await image_requests.do(image_cache.normalize(prompt), ImageAgent._generate_image, prompt)
+
+    @staticmethod
+    def _image_reply(prompt: str, img_filename: str) -> str:
+        return (
+            f"I have created an image for the prompt: {prompt}\n"
+            f"url: {image_store.url(img_filename)}\n"
+            "note that the final output should contain all this information including the comment and url"
+        )
+
+    @staticmethod
+    async def _generate_image(prompt: str) -> str:
         url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-preview-image-generation:generateContent"
-        headers = {
-            "x-goog-api-key": get_api_key(),
-            "Content-Type": "application/json"
-        }
         payload = {
             "contents": [{
                 "parts": [{"text": prompt}]
@@ -71,24 +99,31 @@ class ImageAgent:
             "generationConfig": {"responseModalities": ["TEXT", "IMAGE"]}
         }
 
-        async with aiohttp.ClientSession() as session:
+        # The key comes from the shared router so image calls count against the same quotas
+        async with get_router().lease() as lease:
+            session = get_http_session()
+            headers = {
+                "x-goog-api-key": lease.api_key,
+                "Content-Type": "application/json"
+            }
             async with session.post(url, headers=headers, json=payload) as resp:
                 if resp.status != 200:
+                    lease.fail(resp.status)
                     return f"Request failed with status code {resp.status}"
-                response_json = await resp.json()
-                # Traverse to find the base64-encoded image. This depends on actual API response structure.
-                image_base64  = response_json["candidates"][0]["content"]["parts"][1]["inlineData"]["data"]
-                if not image_base64:
-                    return "Image data not found in the response"
-                # Decode and save the image
-                img_filename = f"images/{invoke_uid(prefix='img')}.png"
-                with open(img_filename, "wb") as f:
-                    f.write(base64.b64decode(image_base64))
-                return (
-                    f"I have created an image for the prompt: {prompt}\n"
-                    f"url: {Var.BASE_URL}/{img_filename}\n"
-                    "note that the final output should contain all this information including the comment and url"
-                )
+                # The body carries the whole image as base64, so parse it off the event loop
+                response_json = await asyncio.to_thread(json.loads, await resp.read())
+
+        # Traverse to find the base64-encoded image. This depends on actual API response structure.
+        parts = response_json["candidates"][0]["content"]["parts"]
+        inline_data = next((part["inlineData"] for part in parts if "inlineData" in part), {})
+        if not inline_data.get("data"):
+            return "Image data not found in the response"
+        # Decode and save the image (stored once per distinct image)
+        img_filename = await image_store.save_base64(inline_data["data"], inline_data.get("mimeType", "image/png"))
+        image_cache.put(prompt, img_filename)
+        # Decoded size of the base64 data; variants are picked up by the next scan
+        await image_cache.enforce_disk_limit(len(inline_data["data"]) * 3 // 4)
+        return ImageAgent._image_reply(prompt, img_filename)
 
     @staticmethod
     def create_workflow(agent_executor):
@@ -122,10 +157,11 @@ class ImageAgent:
     async def run(self, query: str):
         result = None
         query = "Create an image from prompt" + query
+        # Retries only re-invoke the compiled graph
+        agent = self.get_agent()
         for i in range(3):
             try:
-                self.agent = self.get_agent()
-                result = await self.agent.ainvoke({
+                result = await agent.ainvoke({
                     "question": query,
                     "response": None
                 })
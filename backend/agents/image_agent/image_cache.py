@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+import collections
+from typing import Optional
+
+from globar_vars import Var
+from agents.image_agent.image_store import ImageStore, image_store
+
+
+class ImageCache:
+    """Maps normalized prompts to already generated images.
+
+    Entries expire after `ttl` seconds and the least recently used ones are
+    dropped beyond `max_entries`. Separately, the image directory is kept under
+    `max_disk_bytes` by deleting the least recently used files; entries whose
+    file is gone simply miss. The directories are only scanned when a running
+    total of the bytes written since the last scan says the limit was crossed.
+    """
+
+    def __init__(self, store: ImageStore, max_entries: int, ttl: float, max_disk_bytes: int, cost_per_image: float):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.cost_per_image = cost_per_image
+        # normalized prompt -> (filename, stored_at)
+        self._entries = collections.OrderedDict()
+        # Bytes on disk as of the last scan plus what was written since; None until the first scan
+        self._disk_bytes: Optional[int] = None
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'files_removed': 0, 'disk_bytes': 0}
+
+    @staticmethod
+    def normalize(prompt: str) -> str:
+        return ' '.join(prompt.lower().split())
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        # Bump mtime so disk eviction sees the file as recently used; False if it was evicted
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    async def get(self, prompt: str) -> Optional[str]:
+        key = self.normalize(prompt)
+        entry = self._entries.get(key)
+        if entry is not None:
+            filename, stored_at = entry
+            if stored_at + self.ttl > time.time() and await asyncio.to_thread(self._touch, self.store.path(filename)):
+                # The entry may have been replaced while we were on the thread
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return filename
+            if self._entries.get(key) == entry:
+                del self._entries[key]
+                self.stats['evictions'] += 1
+        self.stats['misses'] += 1
+        return None
+
+    def put(self, prompt: str, filename: str):
+        key = self.normalize(prompt)
+        self._entries[key] = (filename, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _enforce_disk_limit(self):
+        files = []
+        for directory in (self.store.directory, self.store.variant_directory):
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_disk_bytes:
+            self._disk_bytes = self.stats['disk_bytes'] = total
+            return
+        # Evict down to a low-water mark so the next scan is a while away
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.stats['files_removed'] += 1
+        self._disk_bytes = self.stats['disk_bytes'] = total
+
+    async def enforce_disk_limit(self, added_bytes: int = 0):
+        """Accounts for `added_bytes` just written and evicts files if that takes the total over the limit."""
+        if self._disk_bytes is not None:
+            self._disk_bytes += added_bytes
+            self.stats['disk_bytes'] = self._disk_bytes
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+        await asyncio.to_thread(self._enforce_disk_limit)
+
+    def metrics(self) -> dict:
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'entries': len(self._entries),
+            'hit_rate': self.stats['hits'] / lookups if lookups else 0.0,
+            'cost_saved_usd': round(self.stats['hits'] * self.cost_per_image, 4),
+        }
+
+
+image_cache = ImageCache(
+    image_store,
+    max_entries=Var.IMAGE_CACHE_SIZE,
+    ttl=Var.IMAGE_CACHE_TTL,
+    max_disk_bytes=Var.IMAGES_MAX_BYTES,
+    cost_per_image=Var.IMAGE_COST_USD,
+)
@@ -0,0 +1,108 @@
+import os
+import base64
+import asyncio
+import hashlib
+
+from globar_vars import Var
+from utils.files import atomic_write
+from utils.singleflight import SingleFlight
+
+EXTENSIONS = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/webp': 'webp', 'image/gif': 'gif'}
+# Variant widths are rounded up to one of these so the variant cache stays bounded
+VARIANT_WIDTHS = (128, 256, 512, 1024, 1280, 2048)
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG', 'png': 'PNG'}
+
+
+class ImageStore:
+    """Content-addressed image files under `directory`, served at /images.
+
+    Files are named after the SHA-256 of their bytes, so the same image is only
+    ever stored once. Decoding, hashing and writing happen in a worker thread so
+    a large image doesn't stall the event loop.
+    """
+
+    def __init__(self, directory: str = 'images'):
+        self.directory = directory
+        # Downscaled / re-encoded copies, generated on demand
+        self.variant_directory = os.path.join(directory, '.variants')
+        # (path, mtime_ns, size) -> strong ETag
+        self._etags = {}
+        # Concurrent first requests for one variant (e.g. a bulk send's fetches) build it once
+        self._variant_builds = SingleFlight()
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.directory, filename)
+
+    def _save(self, data: bytes, mime_type: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        filename = f"img_{digest}.{EXTENSIONS.get(mime_type, 'png')}"
+        path = self.path(filename)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temp file first so readers never see a partial image
+            atomic_write(path, lambda f: f.write(data))
+        return filename
+
+    def _save_base64(self, image_base64: str, mime_type: str) -> str:
+        return self._save(base64.b64decode(image_base64), mime_type)
+
+    async def save_base64(self, image_base64: str, mime_type: str = 'image/png') -> str:
+        """Stores a base64-encoded image and returns its filename."""
+        return await asyncio.to_thread(self._save_base64, image_base64, mime_type)
+
+    async def save_bytes(self, data: bytes, mime_type: str = 'image/png') -> str:
+        return await asyncio.to_thread(self._save, data, mime_type)
+
+    @staticmethod
+    def url(filename: str) -> str:
+        return f"{Var.BASE_URL}/images/{filename}"
+
+    @staticmethod
+    def delivery_url(image_url: str, width: int = 1280, fmt: str = 'jpeg') -> str:
+        """Our own image URLs get a downscaled variant for messengers; anything else passes through."""
+        if not image_url.startswith(f"{Var.BASE_URL}/images/") or '?' in image_url:
+            return image_url
+        return f"{image_url}?w={width}&format={fmt}"
+
+    def _etag(self, path: str) -> str:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        etag = self._etags.get(key)
+        if etag is None:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            if len(self._etags) > 4096:
+                self._etags.clear()
+            etag = self._etags[key] = f'"{digest.hexdigest()[:32]}"'
+        return etag
+
+    async def etag(self, path: str) -> str:
+        """Strong ETag from the file's bytes, hashed once per version of the file."""
+        return await asyncio.to_thread(self._etag, path)
+
+    def _make_variant(self, filename: str, width: int, fmt: str) -> str:
+        stem = filename.rsplit('.', 1)[0]
+        path = os.path.join(self.variant_directory, f"{stem}_w{width}.{fmt}")
+        if os.path.exists(path):
+            return path
+        from PIL import Image
+
+        os.makedirs(self.variant_directory, exist_ok=True)
+        with Image.open(self.path(filename)) as image:
+            image.thumbnail((width, width))
+            if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            atomic_write(path, lambda f: image.save(f, format=VARIANT_FORMATS[fmt]))
+        return path
+
+    async def variant(self, filename: str, width: int = None, fmt: str = None) -> str:
+        """Path of the image resized to fit `width` and/or re-encoded as `fmt`, built and cached on first use."""
+        width = next((w for w in VARIANT_WIDTHS if w >= width), VARIANT_WIDTHS[-1]) if width else VARIANT_WIDTHS[-1]
+        fmt = fmt if fmt in VARIANT_FORMATS else 'webp'
+        return await self._variant_builds.do((filename, width, fmt), asyncio.to_thread,
+                                             self._make_variant, filename, width, fmt)
+
+
+image_store = ImageStore()
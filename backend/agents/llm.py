@@ -1,20 +1,223 @@
-from globar_vars import Var
-from langchain_google_genai import ChatGoogleGenerativeAI
+import time
 import random
+import asyncio
+from typing import Any, Optional
+from contextlib import asynccontextmanager
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatResult, ChatGeneration
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from globar_vars import Var
+from utils.ratelimit import TokenBucket
+from agents.llm_cache import get_llm_cache, llm_cache_enabled
+
+MODEL = 'gemini-2.0-flash-lite'
+TEMPERATURE = 0.3
+
+
+def _error_status(exc: Exception) -> Optional[int]:
+    """Best-effort HTTP status of a failed Gemini call (429, 5xx, ...)."""
+    for attr in ('status_code', 'code', 'status'):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    name = type(exc).__name__
+    if name in ('ResourceExhausted', 'TooManyRequests'):
+        return 429
+    if name in ('ServiceUnavailable', 'InternalServerError', 'DeadlineExceeded'):
+        return 503
+    return None
+
+
+def _estimate_tokens(messages) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return sum(len(str(message.content)) for message in messages) // 4 + 1
+
+
+class KeySlot:
+    """One Gemini API key with its own rate limits, in-flight cap, latency estimate and cooldown."""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.rpm = TokenBucket.per_minute(Var.LLM_RPM)
+        self.tpm = TokenBucket.per_minute(Var.LLM_TPM)
+        self.inflight = 0
+        self.latency = 1.0  # EWMA, seconds
+        self.cooldown_until = 0.0
+        self.failures = 0
+        self._llm = None
+
+    @property
+    def llm(self) -> ChatGoogleGenerativeAI:
+        if self._llm is None:
+            self._llm = ChatGoogleGenerativeAI(google_api_key=self.api_key, model=MODEL, temperature=TEMPERATURE)
+        return self._llm
+
+    def wait_time(self, tokens: int) -> float:
+        """Seconds until this key could take a call of `tokens` (0 = now, inf = only after a release)."""
+        if self.inflight >= Var.LLM_MAX_INFLIGHT:
+            return float('inf')
+        return max(self.cooldown_until - time.monotonic(), self.rpm.wait_time(1), self.tpm.wait_time(tokens))
+
+
+class Lease:
+    def __init__(self, slot: KeySlot):
+        self.slot = slot
+        self.api_key = slot.api_key
+        self.status = None
+        self.tokens = 0
+
+    @property
+    def llm(self) -> ChatGoogleGenerativeAI:
+        return self.slot.llm
+
+    def fail(self, status: Optional[int]):
+        """Marks the call as failed with the given HTTP status, for callers that don't raise."""
+        self.status = status or 0
+
+
+class LLMRouter:
+    """Spreads Gemini calls over the configured API keys.
+
+    Each key has RPM/TPM token buckets and a cap on concurrent calls. Among the
+    keys that can take a call right now, one is picked at random weighted by
+    1 / (latency * (in-flight + 1)), so fast idle keys get most of the traffic.
+    A key that answers 429 or 5xx sits out a cooldown that doubles on repeated
+    failures.
+    """
+
+    def __init__(self, api_keys: list[str]):
+        self.slots = [KeySlot(api_key) for api_key in api_keys]
+        self._released = asyncio.Event()
+
+    def _pick(self, tokens: int) -> Optional[KeySlot]:
+        ready = [slot for slot in self.slots if slot.wait_time(tokens) == 0]
+        if not ready:
+            return None
+        weights = [1 / (slot.latency * (slot.inflight + 1)) for slot in ready]
+        return random.choices(ready, weights=weights)[0]
+
+    def _start(self, slot: KeySlot, tokens: int):
+        slot.rpm.consume(1)
+        slot.tpm.consume(tokens)
+        slot.inflight += 1
+
+    def _finish(self, slot: KeySlot, started: float, status: Optional[int], extra_tokens: int = 0):
+        slot.inflight -= 1
+        if extra_tokens > 0:
+            slot.tpm.consume(extra_tokens)
+        if status is None:
+            slot.failures = 0
+            slot.latency = 0.8 * slot.latency + 0.2 * (time.monotonic() - started)
+        elif status == 429 or status >= 500:
+            slot.failures += 1
+            slot.cooldown_until = time.monotonic() + min(Var.LLM_COOLDOWN * 2 ** (slot.failures - 1), 300)
+            print(f"LLM key ...{slot.api_key[-4:]} cooling down after status {status}")
+        self._released.set()
+
+    async def _acquire(self, tokens: int) -> KeySlot:
+        while True:
+            # Clear before looking so a release between the check and the wait isn't missed
+            self._released.clear()
+            slot = self._pick(tokens)
+            if slot:
+                self._start(slot, tokens)
+                return slot
+            wait = min(slot.wait_time(tokens) for slot in self.slots)
+            try:
+                await asyncio.wait_for(self._released.wait(), timeout=None if wait == float('inf') else wait)
+            except asyncio.TimeoutError:
+                pass
+
+    @asynccontextmanager
+    async def lease(self, tokens: int = 1):
+        """Reserves a key for one call; failures are recorded from exceptions or Lease.fail()."""
+        slot = await self._acquire(tokens)
+        lease = Lease(slot)
+        started = time.monotonic()
+        status, extra_tokens = 0, 0
+        try:
+            yield lease
+            status, extra_tokens = lease.status, lease.tokens - tokens
+        except Exception as e:
+            status = _error_status(e) or 0
+            raise
+        finally:
+            # Also runs on cancellation, which isn't an Exception, so the slot is never leaked
+            self._finish(slot, started, status, extra_tokens)
+
+    def pick_nowait(self, tokens: int = 1) -> KeySlot:
+        # Sync callers can't wait for capacity: fall back to the key that frees up first
+        return self._pick(tokens) or min(self.slots, key=lambda slot: slot.wait_time(tokens))
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model that sends each call through the shared LLMRouter."""
+
+    model: str = MODEL
+    temperature: float = TEMPERATURE
+
+    @property
+    def _llm_type(self) -> str:
+        return 'routed-google-genai'
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {'model': self.model, 'temperature': self.temperature}
+
+    @staticmethod
+    def _used_tokens(result: ChatResult) -> int:
+        usage = getattr(result.generations[0].message, 'usage_metadata', None) if result.generations else None
+        return usage.get('total_tokens', 0) if usage else 0
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        router = get_router()
+        slot = router.pick_nowait(_estimate_tokens(messages))
+        router._start(slot, _estimate_tokens(messages))
+        started, status, used = time.monotonic(), None, 0
+        try:
+            result = slot.llm._generate(messages, stop=stop, **kwargs)
+            used = self._used_tokens(result)
+            return result
+        except Exception as e:
+            status = _error_status(e) or 0
+            raise
+        finally:
+            router._finish(slot, started, status, used - _estimate_tokens(messages))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        cache = get_llm_cache() if llm_cache_enabled.get() else None
+        if cache:
+            key = cache.make_key(self.model, self.temperature, messages, stop, kwargs.get('tools'))
+            cached = await cache.get(key)
+            if cached is not None:
+                return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text)) for text in cached])
+
+        async with get_router().lease(_estimate_tokens(messages)) as lease:
+            result = await lease.llm._agenerate(messages, stop=stop, **kwargs)
+            lease.tokens = self._used_tokens(result)
+
+        if cache:
+            await cache.set(key, [generation.message.content for generation in result.generations])
+        return result
+
 
-llm_list = []
-for api_key in Var.GOOGLE_API_KEYS:
-    llm = ChatGoogleGenerativeAI(
-        google_api_key=api_key,
-        model='gemini-2.0-flash-lite',
-        temperature=0.3)
-    # print(llm.get_num_tokens())
-    llm_list.append(llm)
+_router = None
+_llm = None
 
 
-def get_api_key():
-    return random.choice(Var.GOOGLE_API_KEYS)
+def get_router() -> LLMRouter:
+    # Built on first use rather than at import time
+    global _router
+    if _router is None:
+        _router = LLMRouter(Var.GOOGLE_API_KEYS)
+    return _router
 
 
 def get_llm():
-    return random.choice(llm_list)
+    global _llm
+    if _llm is None:
+        _llm = RoutedChatModel()
+    return _llm
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import datetime
+import collections
+from contextvars import ContextVar
+from typing import Optional
+
+from globar_vars import Var
+from utils.files import atomic_write
+
+# Per-node opt-out: the workflow executor sets this for the duration of a node run
+llm_cache_enabled: ContextVar[bool] = ContextVar('llm_cache_enabled', default=True)
+
+
+class MemoryBackend:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value, ttl: float):
+        self._entries[key] = (time.time() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class DiskBackend:
+    """One JSON file per key; survives restarts and is shared by workers on the same host."""
+
+    def __init__(self, directory: str = 'llm_cache'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _read(self, key: str):
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry['expires_at'] < time.time():
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            return None
+        return entry['value']
+
+    def _write(self, key: str, value, ttl: float):
+        atomic_write(self._path(key), lambda f: json.dump({'expires_at': time.time() + ttl, 'value': value}, f),
+                     mode='w')
+
+    async def get(self, key: str):
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, value, ttl: float):
+        await asyncio.to_thread(self._write, key, value, ttl)
+
+
+class MongoBackend:
+    """Entries in the `llm_cache` collection, expired by a Mongo TTL index."""
+
+    def __init__(self):
+        self._indexed = False
+
+    @property
+    def collection(self):
+        return Var.db.db['llm_cache']
+
+    async def get(self, key: str):
+        doc = await self.collection.find_one({'_id': key})
+        # The TTL monitor only runs once a minute, so check expiry here too
+        if not doc:
+            return None
+        expires_at = doc['expires_at']
+        # Motor hands dates back as naive UTC unless the client is tz_aware
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
+        if expires_at.timestamp() < time.time():
+            return None
+        return doc['value']
+
+    async def set(self, key: str, value, ttl: float):
+        if not self._indexed:
+            await self.collection.create_index('expires_at', expireAfterSeconds=0)
+            self._indexed = True
+        expires_at = datetime.datetime.fromtimestamp(time.time() + ttl, datetime.timezone.utc)
+        await self.collection.update_one({'_id': key}, {'$set': {'value': value, 'expires_at': expires_at}},
+                                         upsert=True)
+
+
+class LLMResponseCache:
+    """Content-addressed cache of chat model outputs.
+
+    Lookups go through the backends in order (e.g. memory, then disk/Mongo) and
+    a hit in a slower tier is copied into the faster ones. Values are the list of
+    generated message texts.
+    """
+
+    def __init__(self, backends: list, ttl: float = 3600):
+        self.backends = backends
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'errors': 0}
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages, stop=None, tools=None) -> str:
+        tool_hash = hashlib.sha256(json.dumps(tools, sort_keys=True, default=str).encode()).hexdigest()
+        payload = {
+            'model': model,
+            'temperature': temperature,
+            'messages': [[message.type, message.content] for message in messages],
+            'stop': stop,
+            'tools': tool_hash,
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    async def get(self, key: str):
+        for i, backend in enumerate(self.backends):
+            try:
+                value = await backend.get(key)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"LLM cache {type(backend).__name__} get failed: {e}")
+                continue
+            if value is not None:
+                self.stats['hits'] += 1
+                for faster in self.backends[:i]:
+                    await faster.set(key, value, self.ttl)
+                return value
+        self.stats['misses'] += 1
+        return None
+
+    async def set(self, key: str, value):
+        for backend in self.backends:
+            try:
+                await backend.set(key, value, self.ttl)
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"LLM cache {type(backend).__name__} set failed: {e}")
+
+
+_cache = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """The process-wide cache, or None unless LLM_CACHE is set to memory, disk or mongo."""
+    global _cache
+    if _cache is None and Var.LLM_CACHE in ('memory', 'disk', 'mongo'):
+        backends = [MemoryBackend(Var.LLM_CACHE_SIZE)]
+        if Var.LLM_CACHE == 'disk':
+            backends.append(DiskBackend())
+        elif Var.LLM_CACHE == 'mongo':
+            backends.append(MongoBackend())
+        _cache = LLMResponseCache(backends, ttl=Var.LLM_CACHE_TTL)
+    return _cache
@@ -0,0 +1,97 @@
+import json
+import time
+import asyncio
+import hashlib
+import collections
+from contextlib import asynccontextmanager
+
+
+def agent_pool_key(node_class: str, creds: list, tool_funcs) -> str:
+    """Node class plus a hash of the creds and enabled tools, i.e. everything an agent is built from."""
+    digest = hashlib.sha256(json.dumps([creds, sorted(tool_funcs)], sort_keys=True).encode()).hexdigest()
+    return f"{node_class}:{digest}"
+
+
+class AgentPool:
+    """Keeps warm agent instances so workflow runs don't rebuild bots, clients and graphs.
+
+    Agents are borrowed for exactly one run and handed back afterwards, so an
+    instance is never used by two runs at once. At most `max_idle` instances are
+    kept around, and any that sat unused for `idle_ttl` seconds are closed.
+    """
+
+    def __init__(self, max_idle: int = 64, idle_ttl: float = 600):
+        self.max_idle = max_idle
+        self.idle_ttl = idle_ttl
+        # id(agent) -> (key, agent, returned_at), oldest first
+        self._idle = collections.OrderedDict()
+        self._by_key = collections.defaultdict(list)
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _take(self, key: str):
+        ids = self._by_key.get(key)
+        if not ids:
+            return None
+        agent_id = ids.pop()
+        if not ids:
+            del self._by_key[key]
+        return self._idle.pop(agent_id)[1]
+
+    def _drop(self, agent_id: int):
+        key, agent, _ = self._idle.pop(agent_id)
+        self._by_key[key].remove(agent_id)
+        if not self._by_key[key]:
+            del self._by_key[key]
+        self.stats['evictions'] += 1
+        return agent
+
+    @staticmethod
+    async def _close(agent):
+        close = getattr(agent, 'close', None)
+        if close:
+            try:
+                await close()
+            except Exception as e:
+                print(f"Error closing pooled agent {type(agent).__name__}: {e}")
+
+    async def evict_idle(self):
+        """Closes agents that have been idle for longer than idle_ttl."""
+        deadline = time.monotonic() - self.idle_ttl
+        # Instances are appended as they come back, so the stale ones are all at the front
+        while self._idle:
+            agent_id, (_, _, returned_at) = next(iter(self._idle.items()))
+            if returned_at >= deadline:
+                break
+            await self._close(self._drop(agent_id))
+
+    @asynccontextmanager
+    async def borrow(self, key: str, agent_class, creds: list, tool_funcs):
+        await self.evict_idle()
+        agent = self._take(key)
+        if agent is None:
+            self.stats['misses'] += 1
+            agent = agent_class(creds)
+            agent.tools = [getattr(agent.struct_tools, tool_func) for tool_func in tool_funcs]
+        else:
+            self.stats['hits'] += 1
+
+        try:
+            yield agent
+        except BaseException:
+            # Don't hand a possibly broken instance to the next run
+            await self._close(agent)
+            raise
+
+        self._idle[id(agent)] = (key, agent, time.monotonic())
+        self._by_key[key].append(id(agent))
+        while len(self._idle) > self.max_idle:
+            await self._close(self._drop(next(iter(self._idle))))
+
+    async def close(self):
+        agents = [agent for _, agent, _ in self._idle.values()]
+        self._idle.clear()
+        self._by_key.clear()
+        await asyncio.gather(*(self._close(agent) for agent in agents))
+
+
+agent_pool = AgentPool()
@@ -0,0 +1,75 @@
+import json
+import os
+
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+# Versioned local copies of hub prompts live here as <owner>__<name>.json
+PROMPT_DIR = os.path.join(os.path.dirname(__file__), 'prompts')
+STRUCTURED_CHAT_AGENT = "hwchase17/structured-chat-agent"
+
+_prompts = {}
+
+
+def _prompt_path(name: str) -> str:
+    return os.path.join(PROMPT_DIR, name.replace('/', '__') + '.json')
+
+
+def _build_prompt(data: dict) -> ChatPromptTemplate:
+    messages = []
+    for message in data['messages']:
+        if message['role'] == 'placeholder':
+            messages.append(MessagesPlaceholder(variable_name=message['variable'],
+                                                optional=message.get('optional', False)))
+        else:
+            messages.append((message['role'], message['template']))
+    return ChatPromptTemplate.from_messages(messages)
+
+
+def load_prompt_data(name: str = STRUCTURED_CHAT_AGENT) -> dict:
+    with open(_prompt_path(name)) as f:
+        return json.load(f)
+
+
+def get_prompt(name: str = STRUCTURED_CHAT_AGENT) -> ChatPromptTemplate:
+    """Returns the prompt from its local copy, loading it only once per process."""
+    prompt = _prompts.get(name)
+    if prompt is None:
+        prompt = _prompts[name] = _build_prompt(load_prompt_data(name))
+    return prompt
+
+
+def refresh_prompt(name: str = STRUCTURED_CHAT_AGENT) -> ChatPromptTemplate:
+    """Pulls the prompt from the LangSmith hub, saves it as the next local version and swaps it in."""
+    from langsmith import Client
+
+    hub_prompt = Client().pull_prompt(name)
+    messages = []
+    for message in hub_prompt.messages:
+        if isinstance(message, MessagesPlaceholder):
+            messages.append({'role': 'placeholder', 'variable': message.variable_name, 'optional': message.optional})
+        else:
+            role = {'SystemMessagePromptTemplate': 'system',
+                    'HumanMessagePromptTemplate': 'human',
+                    'AIMessagePromptTemplate': 'ai'}[type(message).__name__]
+            messages.append({'role': role, 'template': message.prompt.template})
+
+    try:
+        version = load_prompt_data(name)['version'] + 1
+    except FileNotFoundError:
+        version = 1
+    data = {'name': name, 'version': version, 'messages': messages}
+    with open(_prompt_path(name), 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+    prompt = _prompts[name] = _build_prompt(data)
+    return prompt
+
+
+if __name__ == "__main__":
+    # python -m agents.prompt_registry [name]  -> refresh the local copy from the hub
+    import sys
+
+    refreshed = sys.argv[1] if len(sys.argv) > 1 else STRUCTURED_CHAT_AGENT
+    refresh_prompt(refreshed)
+    print(f"Saved {refreshed} v{load_prompt_data(refreshed)['version']} to {_prompt_path(refreshed)}")
@@ -0,0 +1,102 @@
+import time
+import collections
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+
+from globar_vars import Var
+from agents.telegram_agent.outbox import Outbox, make_outbox
+
+
+class BotRegistry:
+    """One aiogram `Bot` per token, shared by every agent and trigger in the process.
+
+    All bots talk to api.telegram.org through a single aiohttp session, so its
+    connection pool is reused across bots. Holders `acquire` a bot and `release`
+    it when done, and the session itself is closed from the FastAPI lifespan on
+    shutdown.
+
+    A bot nobody holds keeps its outbox, with its file_id cache, for up to
+    `idle_ttl` seconds in an LRU of `max_idle` bots, so send-only bots whose
+    agents come and go between bursts don't start from scratch each time. An
+    outbox with sends still pending is never dropped, so a token only ever has
+    one outbox sending for it.
+    """
+
+    def __init__(self, limit: int = 100, max_idle: int = 256, idle_ttl: float = 3600):
+        self.limit = limit
+        self.max_idle = max_idle
+        self.idle_ttl = idle_ttl
+        self._session: Optional[AiohttpSession] = None
+        # token -> [bot, refcount, outbox]
+        self._bots = {}
+        # token -> (bot, outbox, released_at) of released bots, least recently released first
+        self._idle = collections.OrderedDict()
+
+    def _get_session(self) -> AiohttpSession:
+        if self._session is None:
+            self._session = AiohttpSession(limit=self.limit)
+        return self._session
+
+    def acquire(self, token: str) -> Bot:
+        entry = self._bots.get(token)
+        if entry is None:
+            idle = self._idle.pop(token, None)
+            if idle is not None:
+                bot, outbox, _ = idle
+            else:
+                bot = Bot(token=token, session=self._get_session())
+                outbox = make_outbox(bot)
+            entry = self._bots[token] = [bot, 0, outbox]
+            self._prune()
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, token: str):
+        entry = self._bots.get(token)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            # The bot owns no connections of its own; sends still queued finish on their own
+            del self._bots[token]
+            self._idle[token] = (entry[0], entry[2], time.monotonic())
+            self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
+        for token, (_, outbox, released_at) in list(self._idle.items()):
+            if len(self._idle) <= self.max_idle and released_at + self.idle_ttl > now:
+                break
+            # While it still drains, a second outbox for the token would send alongside it
+            # with full buckets and break the flood limits; keep it until it is done
+            if not outbox.busy:
+                del self._idle[token]
+
+    def get(self, token: str) -> Optional[Bot]:
+        entry = self._bots.get(token)
+        return entry[0] if entry else None
+
+    def outbox(self, token: str) -> Outbox:
+        """The rate-limited send queue of an acquired bot."""
+        return self._bots[token][2]
+
+    async def close_all(self):
+        for _, _, outbox in self._bots.values():
+            await outbox.close()
+        for _, outbox, _ in self._idle.values():
+            await outbox.close()
+        self._bots.clear()
+        self._idle.clear()
+        if self._session is not None:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def stats(self) -> dict:
+        return {'bots': len(self._bots), 'refs': sum(refs for _, refs, _ in self._bots.values()),
+                'idle': len(self._idle)}
+
+
+bot_registry = BotRegistry(limit=Var.HTTP_LIMIT, max_idle=Var.TELEGRAM_IDLE_BOTS, idle_ttl=Var.TELEGRAM_IDLE_TTL)
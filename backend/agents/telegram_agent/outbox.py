@@ -0,0 +1,186 @@
+import asyncio
+import collections
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from globar_vars import Var
+from utils.ratelimit import TokenBucket
+
+# Bot API limit for a single text message
+MAX_TEXT_LENGTH = 4096
+# Remembered photo uploads per bot
+MAX_FILE_IDS = 4096
+
+
+class Outbox:
+    """Rate-limited outbound queue for one bot.
+
+    Every send waits for a token from the bot-wide bucket and from the target
+    chat's bucket (Telegram allows ~30 msg/s per bot, ~1 msg/s per private chat
+    and ~20 msg/min per group). Each chat with pending sends is drained by its
+    own task, in order. Text messages that pile up for the same chat while it is
+    throttled are joined into one message. On `RetryAfter` the whole bot pauses
+    for the requested time and the send is retried.
+
+    Photos sent by URL are remembered by the `file_id` Telegram returns, so
+    later sends of the same URL (our image URLs are content-addressed) reuse
+    the upload instead of making Telegram download it again. File ids are only
+    valid for the bot that received them, hence one cache per outbox.
+    """
+
+    def __init__(self, bot: Bot, global_rate: float = 30, chat_rate: float = 1, group_per_minute: float = 20,
+                 max_retries: int = 5):
+        self.bot = bot
+        self.max_retries = max_retries
+        self.chat_rate = chat_rate
+        self.group_per_minute = group_per_minute
+        self._global = TokenBucket(global_rate)
+        self._chat_buckets = {}
+        # chat_id -> deque of (method, kwargs, future)
+        self._pending = collections.defaultdict(collections.deque)
+        self._drains = {}
+        self._paused_until = 0.0
+        # photo URL -> file_id, least recently used first
+        self._file_ids = collections.OrderedDict()
+        # photo URL -> event set once its first upload finishes
+        self._uploads = {}
+        self.stats = {'sent': 0, 'coalesced': 0, 'retry_after': 0, 'failed': 0, 'file_id_hits': 0}
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                # Forget chats whose bucket has fully refilled; they'd start from full anyway
+                self._chat_buckets = {chat: b for chat, b in self._chat_buckets.items() if b.tokens < b.capacity}
+            # Group and channel ids are negative
+            if chat_id < 0:
+                bucket = TokenBucket.per_minute(self.group_per_minute)
+            else:
+                bucket = TokenBucket(self.chat_rate)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _submit(self, chat_id: int, method: str, kwargs: dict) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[chat_id].append((method, kwargs, future))
+        if chat_id not in self._drains:
+            self._drains[chat_id] = asyncio.create_task(self._drain(chat_id))
+        return future
+
+    async def send_message(self, chat_id: int, text: str):
+        return await self._submit(chat_id, 'send_message', {'text': text})
+
+    async def send_photo(self, chat_id: int, photo):
+        if not isinstance(photo, str) or not photo.startswith(('http://', 'https://')):
+            return await self._submit(chat_id, 'send_photo', {'photo': photo})
+
+        # Let the first send of a URL finish so concurrent sends can reuse its file_id
+        upload = self._uploads.get(photo)
+        if upload is not None:
+            await upload.wait()
+        file_id = self._file_ids.get(photo)
+        if file_id is not None:
+            self._file_ids.move_to_end(photo)
+            try:
+                message = await self._submit(chat_id, 'send_photo', {'photo': file_id})
+                self.stats['file_id_hits'] += 1
+                return message
+            except TelegramBadRequest:
+                # The file id went stale; upload from the URL again
+                self._file_ids.pop(photo, None)
+
+        upload = self._uploads[photo] = asyncio.Event()
+        try:
+            message = await self._submit(chat_id, 'send_photo', {'photo': photo})
+            if getattr(message, 'photo', None):
+                self._file_ids[photo] = message.photo[-1].file_id
+                while len(self._file_ids) > MAX_FILE_IDS:
+                    self._file_ids.popitem(last=False)
+            return message
+        finally:
+            upload.set()
+            if self._uploads.get(photo) is upload:
+                del self._uploads[photo]
+
+    def _next_batch(self, chat_id: int):
+        queue = self._pending[chat_id]
+        method, kwargs, future = queue.popleft()
+        futures = [future]
+        if method == 'send_message':
+            texts = [kwargs['text']]
+            length = len(texts[0])
+            while queue and queue[0][0] == 'send_message' and length + 2 + len(queue[0][1]['text']) <= MAX_TEXT_LENGTH:
+                _, next_kwargs, next_future = queue.popleft()
+                texts.append(next_kwargs['text'])
+                futures.append(next_future)
+                length += 2 + len(next_kwargs['text'])
+            kwargs = {'text': '\n\n'.join(texts)}
+            self.stats['coalesced'] += len(futures) - 1
+        return method, kwargs, futures
+
+    async def _wait_turn(self, chat_id: int):
+        loop = asyncio.get_running_loop()
+        while self._paused_until > loop.time():
+            await asyncio.sleep(self._paused_until - loop.time())
+        await self._chat_bucket(chat_id).acquire()
+        await self._global.acquire()
+
+    async def _call(self, chat_id: int, method: str, kwargs: dict):
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(chat_id)
+            try:
+                return await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.stats['retry_after'] += 1
+                loop = asyncio.get_running_loop()
+                self._paused_until = max(self._paused_until, loop.time() + e.retry_after)
+
+    async def _drain(self, chat_id: int):
+        try:
+            while self._pending[chat_id]:
+                method, kwargs, futures = self._next_batch(chat_id)
+                try:
+                    result = await self._call(chat_id, method, kwargs)
+                except asyncio.CancelledError:
+                    for future in futures:
+                        future.cancel()
+                    raise
+                except Exception as e:
+                    self.stats['failed'] += len(futures)
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.stats['sent'] += 1
+                for future in futures:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._drains.pop(chat_id, None)
+            if not self._pending.get(chat_id):
+                self._pending.pop(chat_id, None)
+
+    @property
+    def busy(self) -> bool:
+        """Whether sends are still queued or in progress."""
+        return bool(self._drains)
+
+    async def close(self):
+        for task in list(self._drains.values()):
+            task.cancel()
+        for queue in self._pending.values():
+            for _, _, future in queue:
+                future.cancel()
+        self._pending.clear()
+
+
+def make_outbox(bot: Bot) -> Outbox:
+    return Outbox(
+        bot,
+        global_rate=Var.TELEGRAM_GLOBAL_RPS,
+        chat_rate=Var.TELEGRAM_CHAT_RPS,
+        group_per_minute=Var.TELEGRAM_GROUP_RPM,
+    )
@@ -1,30 +1,15 @@
 import asyncio
-from aiogram import Bot
 from agents.llm import get_llm
 from langchain.agents.agent import AgentExecutor
 from langchain.agents import create_structured_chat_agent
-from langsmith import Client
+from agents.prompt_registry import get_prompt
+from agents.image_agent.image_store import image_store
+from agents.telegram_agent.bot_pool import bot_registry
 from langchain_core.tools import StructuredTool
 from langchain_core.runnables import chain
 from langgraph.graph import StateGraph, END
 from agents.telegram_agent.schemas import TelegramImageInput, TelegramTextInput, AgentState
 
-# Pull the prompt template from LangSmith Hub
-# You can replace this with your own prompt if you prefer
-
-try:
-    prompt = Client().pull_prompt("hwchase17/structured-chat-agent", include_model=True)
-except Exception as e:
-    print(f"Could not pull prompt from LangSmith. Using a default. Error: {e}")
-    from langchain_core.prompts import ChatPromptTemplate
-
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", "You are a helpful assistant."),
-            ("human", "{input}"),
-            ("placeholder", "{agent_scratchpad}"),
-        ]
-    )
 
 class TelegramAgent:
     def __init__(self, creds: list):
@@ -43,8 +28,11 @@ class TelegramAgent:
         if "bot_token" not in creds:
             raise ValueError("`creds` dictionary must contain a 'bot_token' key.")
 
-        # Initialize Aiogram Bot
-        self.bot = Bot(token=creds["bot_token"])
+        # Bots are shared per token across agents and triggers
+        self.bot_token = creds["bot_token"]
+        self.bot = bot_registry.acquire(self.bot_token)
+        # Sends go through the bot's rate-limited queue
+        self.outbox = bot_registry.outbox(self.bot_token)
         self.llm = get_llm()
         self.struct_tools = self.StructTools(self)
 
@@ -54,7 +42,12 @@ class TelegramAgent:
             self.struct_tools.send_image,
         ]
 
-        self.agent = self.get_agent()
+        # Compiled lazily by get_agent() once the tools are known
+        self.agent = None
+        self._agent_tools = None
+
+    # Attribute names on StructTools that a workflow node may enable
+    tool_funcs = ('send_message', 'send_image')
 
     class StructTools:
         def __init__(self, agent_instance):
@@ -73,10 +66,15 @@ class TelegramAgent:
 
     def get_agent(self):
         """Creates the LangChain agent and wraps it in a LangGraph workflow."""
+        # Reuse the compiled graph until the tool list changes
+        tools_key = tuple(map(id, self.tools))
+        if self.agent is not None and self._agent_tools == tools_key:
+            return self.agent
+
         agent = create_structured_chat_agent(
             llm=self.llm,
             tools=self.tools,
-            prompt=prompt,
+            prompt=get_prompt(),
         )
 
         agent_executor = AgentExecutor.from_agent_and_tools(
@@ -86,14 +84,16 @@ class TelegramAgent:
             handle_parsing_errors=True
         )
 
-        return self.create_workflow(agent_executor)
+        self.agent = self.create_workflow(agent_executor)
+        self._agent_tools = tools_key
+        return self.agent
 
     async def send_message(self, user_id: int, text: str) -> str:
         """
         Sends a text message to a user via Telegram using aiogram.
         """
         try:
-            await self.bot.send_message(chat_id=user_id, text=text)
+            await self.outbox.send_message(user_id, text)
             print(f"Message sent to user {user_id}")
             return f"Successfully sent message to user_id {user_id}."
         except Exception as e:
@@ -106,7 +106,7 @@ class TelegramAgent:
         Sends an image to a user via Telegram using aiogram.
         """
         try:
-            await self.bot.send_photo(chat_id=user_id, photo=image_url)
+            await self.outbox.send_photo(user_id, image_store.delivery_url(image_url))
             print(f"Image sent to user {user_id}")
             return f"Successfully sent image to user_id {user_id}."
         except Exception as e:
@@ -114,6 +114,12 @@ class TelegramAgent:
             print(error_message)
             return error_message
 
+    async def close(self):
+        """Releases the shared bot; called when the agent leaves the pool."""
+        if self.bot is not None:
+            bot_registry.release(self.bot_token)
+            self.bot = None
+
     @staticmethod
     def create_workflow(agent_executor):
         """Defines and compiles the LangGraph workflow."""
@@ -139,10 +145,11 @@ class TelegramAgent:
         """
         result = None
         last_exception = None
+        # Retries only re-invoke the compiled graph
+        agent = self.get_agent()
         for i in range(3):
             try:
-                # No need to re-create the agent here, it's done in __init__
-                result = await self.agent.ainvoke({
+                result = await agent.ainvoke({
                     "question": query,
                 })
                 break
@@ -159,4 +166,4 @@ class TelegramAgent:
 
 async def main():
     agent = TelegramAgent(creds=[{'bot_token': 'bot_token'}])
-    await agent.bot.session.close()
+    await agent.close()
@@ -19,3 +19,9 @@ class WhatsappImageInput(BaseModel):
     number: str = Field(..., description="The Whatsapp number of recipient")
     image_url: str = Field(..., description="The URL for sending image in Whatsapp")
     body : str = Field(..., description="The text for sending image in Whatsapp")
+
+
+class WhatsappBulkInput(BaseModel):
+    numbers: list[str] = Field(..., description="The Whatsapp numbers of all recipients")
+    text: str = Field(..., description="The text to send to every recipient")
+    image_url: Optional[str] = Field(None, description="Optional URL of an image to send with the text")
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Optional
+
+import aiohttp
+
+from globar_vars import Var
+from utils.http import get_http_session
+from utils.ratelimit import TokenBucket
+
+TWILIO_API = 'https://api.twilio.com/2010-04-01'
+
+
+class TwilioError(Exception):
+    def __init__(self, status: int, code: Optional[int], message: str):
+        super().__init__(f"Twilio error {code or status}: {message}")
+        self.status = status
+        self.code = code
+
+
+class TwilioClient:
+    """Minimal async client for Twilio's Messages API.
+
+    Requests go through the shared aiohttp session, so connections to
+    api.twilio.com are kept alive and pooled instead of blocking the event loop
+    in the synchronous SDK. One instance exists per account SID, and all sends
+    on the account share its `rate` messages/second budget.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, max_retries: int = 2, rate: float = 10):
+        self.account_sid = account_sid
+        self.auth = aiohttp.BasicAuth(account_sid, auth_token)
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+        self.messages_url = f'{TWILIO_API}/Accounts/{account_sid}/Messages.json'
+
+    async def create_message(self, from_: str, to: str, body: str = None, media_url: list[str] = None) -> dict:
+        """Sends a message and returns Twilio's message resource (sid, status, ...)."""
+        data = [('From', from_), ('To', to)]
+        if body:
+            data.append(('Body', body))
+        for url in media_url or []:
+            data.append(('MediaUrl', url))
+
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            async with get_http_session().post(self.messages_url, data=data, auth=self.auth) as response:
+                payload = await response.json(content_type=None)
+                if response.status < 400:
+                    return payload
+                # Throttled or briefly unavailable: back off and try again
+                if response.status in (429, 503) and attempt < self.max_retries:
+                    await asyncio.sleep(float(response.headers.get('Retry-After', 2 ** attempt)))
+                    continue
+                raise TwilioError(response.status, payload.get('code'), payload.get('message', response.reason))
+
+
+_clients = {}
+
+
+def get_twilio_client(account_sid: str, auth_token: str) -> TwilioClient:
+    client = _clients.get(account_sid)
+    if client is None or client.auth.password != auth_token:
+        client = _clients[account_sid] = TwilioClient(account_sid, auth_token, rate=Var.WHATSAPP_MPS)
+    return client
@@ -1,5 +1,5 @@
-from twilio.rest import Client
 import os
+import asyncio
 from dotenv import load_dotenv
 from globar_vars import Var
 
@@ -16,7 +16,7 @@ load_dotenv()
 async def snd_image(creds, to_number: str, image_url: str, body: str = "Here's an image for you!"):
     try:
         print(image_url)
-        message = creds.get("whatsapp_client").messages.create(
+        message = await creds.get("whatsapp_client").create_message(
             from_=creds.get("whatsapp_number", os.getenv("WHATSAPP_NUMBER")),
             to=f'whatsapp:{to_number}',
             body=body,
@@ -28,7 +28,7 @@ async def snd_image(creds, to_number: str, image_url: str, body: str = "Here's a
 
 async def snd_message(creds, to_number: str, body: str):
     try:
-        message = creds.get("whatsapp_client").messages.create(
+        message = await creds.get("whatsapp_client").create_message(
             from_=creds.get("whatsapp_number"),
             to=f'whatsapp:{to_number}',
             body=body
@@ -36,6 +36,32 @@ async def snd_message(creds, to_number: str, body: str):
         return "Message sent successfully"
     except Exception as e:
         return "Error sending message: " + str(e)
+
+async def snd_bulk(creds, to_numbers: list[str], body: str, image_url: str = None, concurrency: int = 20) -> dict:
+    """Sends the same message to many numbers at once; the account's rate limit paces the actual sends."""
+    limit = asyncio.Semaphore(concurrency)
+    client = creds.get("whatsapp_client")
+    from_number = creds.get("whatsapp_number", os.getenv("WHATSAPP_NUMBER"))
+
+    async def send_one(number: str):
+        async with limit:
+            try:
+                await client.create_message(
+                    from_=from_number,
+                    to=f'whatsapp:{number}',
+                    body=body,
+                    media_url=[image_url] if image_url else None,
+                )
+                return None
+            except Exception as e:
+                return str(e)
+
+    # Duplicates would only double-message someone
+    numbers = list(dict.fromkeys(to_numbers))
+    errors = await asyncio.gather(*(send_one(number) for number in numbers))
+    failed = {number: error for number, error in zip(numbers, errors) if error is not None}
+    return {'total': len(numbers), 'sent': len(numbers) - len(failed), 'failed': failed}
+
 # cred = {"whatsapp_client": client,"account_sid":ACCOUNT_SID, "auth_token":AUTH_TOKEN, "whatsapp_number":WHATSAPP_NUMBER, }
 # snd_message('+918891636432', "Myre")
 # print(snd_image(cred,"+918891636432", "https://encrypted-tbn0.gstatic.com/images?q=tbn:ANd9GcSE_VHEsIHyx5bJ9AdDPUYMIsMd-1u14szqsA&s", "here is the image"))
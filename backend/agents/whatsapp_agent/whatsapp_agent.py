@@ -1,23 +1,22 @@
 import asyncio
 import os
 from http.client import responses
-from langsmith import Client
+from agents.prompt_registry import get_prompt
+from agents.image_agent.image_store import image_store
 from agents.llm import get_llm
 from langchain_core.runnables import chain
 from langgraph.graph import StateGraph, END
 from langchain_core.tools import StructuredTool
 from langchain.agents.agent import AgentExecutor
 from langchain.agents import create_structured_chat_agent
-from agents.whatsapp_agent.schemas import WhatsappTextInput, WhatsappImageInput, AgentState
-from agents.whatsapp_agent.whatsapp import snd_image, snd_message
-from twilio.rest import Client as Whatsapp
+from agents.whatsapp_agent.schemas import WhatsappTextInput, WhatsappImageInput, WhatsappBulkInput, AgentState
+from agents.whatsapp_agent.whatsapp import snd_image, snd_message, snd_bulk
+from agents.whatsapp_agent.twilio_client import get_twilio_client
 from globar_vars import Var
 from dotenv import load_dotenv
 
 load_dotenv()
 
-prompt = Client().pull_prompt("hwchase17/structured-chat-agent", include_model=True)
-
 
 class WhatsappAgent:
     def __init__(self, creds:list):
@@ -28,9 +27,15 @@ class WhatsappAgent:
             for key, val in cred.items():
                 creds2[key] = val
         self.creds = creds2
-        self.creds["whatsapp_client"] = Whatsapp(self.creds.get('account_sid', os.environ.get('ACCOUNT_SID')), self.creds.get('auth_token', os.environ.get('AUTH_TOKEN')))
+        # One pooled, non-blocking client per account SID
+        self.creds["whatsapp_client"] = get_twilio_client(self.creds.get('account_sid', os.environ.get('ACCOUNT_SID')), self.creds.get('auth_token', os.environ.get('AUTH_TOKEN')))
         self.struct_tools = self.StructTools(self)
-        self.agent = self.get_agent()
+        # Compiled lazily by get_agent() once the tools are known
+        self.agent = None
+        self._agent_tools = None
+
+    # Attribute names on StructTools that a workflow node may enable
+    tool_funcs = ('send_message', 'send_image', 'send_bulk')
 
     class StructTools:
         def __init__(self, other_self):
@@ -46,12 +51,23 @@ class WhatsappAgent:
                 description="""Send image through Whatsapp""",
                 args_schema=WhatsappImageInput
             )
+            self.send_bulk = StructuredTool.from_function(
+                name="send_bulk",
+                coroutine=other_self.send_bulk,
+                description="""Send the same message (and optional image) to many Whatsapp numbers in one step""",
+                args_schema=WhatsappBulkInput
+            )
 
     def get_agent(self):
+        # Reuse the compiled graph until the tool list changes
+        tools_key = tuple(map(id, self.tools))
+        if self.agent is not None and self._agent_tools == tools_key:
+            return self.agent
+
         agent = create_structured_chat_agent(
             llm=self.llm,
             tools=self.tools,
-            prompt=prompt,
+            prompt=get_prompt(),
         )
 
         agent_executor = AgentExecutor.from_agent_and_tools(
@@ -64,6 +80,7 @@ class WhatsappAgent:
         # Create LangGraph workflow
         workflow = self.create_workflow(agent_executor)
         self.agent = workflow
+        self._agent_tools = tools_key
         return workflow
 
     @staticmethod
@@ -76,7 +93,20 @@ class WhatsappAgent:
         return response
 
     async def send_image(self, number: str, image_url: str, body:str):
-        response = await snd_image(self.creds, number, image_url, body)
+        response = await snd_image(self.creds, number, image_store.delivery_url(image_url), body)
+        return response
+
+    async def send_bulk(self, numbers: list[str], text: str, image_url: str = None):
+        if image_url:
+            image_url = image_store.delivery_url(image_url)
+        report = await snd_bulk(self.creds, numbers, text, image_url, concurrency=Var.WHATSAPP_BULK_CONCURRENCY)
+        response = f"Sent {report['sent']} of {report['total']} messages."
+        if report['failed']:
+            # Keep the tool output short enough for the LLM
+            failures = list(report['failed'].items())
+            response += " Failed: " + "; ".join(f"{number}: {error}" for number, error in failures[:20])
+            if len(failures) > 20:
+                response += f"; and {len(failures) - 20} more"
         return response
 
     @staticmethod
@@ -110,10 +140,11 @@ class WhatsappAgent:
     # noinspection PyTypeChecker
     async def run(self, query: str):
         result = None
+        # Retries only re-invoke the compiled graph
+        agent = self.get_agent()
         for i in range(3):
             try:
-                self.agent = self.get_agent()
-                result = await self.agent.ainvoke({
+                result = await agent.ainvoke({
                     "question": query,
                     "response": None
                 })
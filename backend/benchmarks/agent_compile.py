@@ -0,0 +1,64 @@
+"""
+Per-call overhead of rebuilding the agent graph on every run (old behaviour)
+versus compiling it once and re-invoking it (current behaviour).
+
+The LLM is replaced by a fake chat model that answers immediately, so the
+numbers are pure LangChain/LangGraph overhead.
+
+Run from backend/:
+    python -m benchmarks.agent_compile [iterations]
+"""
+import sys
+import time
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from agents.image_agent.image_agent import ImageAgent
+
+FINAL_ANSWER = 'Action:\n```\n{"action": "Final Answer", "action_input": "done"}\n```'
+
+
+def make_agent() -> ImageAgent:
+    agent = ImageAgent([])
+    agent.llm = FakeListChatModel(responses=[FINAL_ANSWER])
+    agent.tools = [agent.struct_tools.generate_image]
+    return agent
+
+
+async def per_call(agent: ImageAgent, iterations: int, recompile: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if recompile:
+            # What every run attempt used to do
+            agent.agent = None
+        await agent.get_agent().ainvoke({"question": "a cute cat", "response": None})
+    return (time.perf_counter() - start) / iterations
+
+
+def compile_only(agent: ImageAgent, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        agent.agent = None
+        agent.get_agent()
+    return (time.perf_counter() - start) / iterations
+
+
+async def main(iterations: int):
+    agent = make_agent()
+    # Warm up imports and first compile
+    await per_call(agent, 3, recompile=True)
+
+    before = await per_call(agent, iterations, recompile=True)
+    after = await per_call(agent, iterations, recompile=False)
+    compile_cost = compile_only(agent, iterations)
+
+    print(f"iterations:             {iterations}")
+    print(f"graph compile:          {compile_cost * 1000:.3f} ms")
+    print(f"per call, recompiling:  {before * 1000:.3f} ms")
+    print(f"per call, cached graph: {after * 1000:.3f} ms")
+    print(f"saved per call:         {(before - after) * 1000:.3f} ms ({(1 - after / before) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -42,6 +42,10 @@ class DataBase:
     async def create_wflow(self, wflow: WFlow):
         await self.wflows.insert_one(wflow.model_dump())
 
+    async def find_wflows_by_trigger(self, node_class: str) -> list[WFlow]:
+        wflow_list = await self.wflows.find({'nodes.node_class': node_class}, {'_id': 0}).to_list(None)
+        return [WFlow(**wflow_data) for wflow_data in wflow_list]
+
     ##############################################################################################
     # USER FUNCTIONS #############################################################################
     ##############################################################################################
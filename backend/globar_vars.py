@@ -1,14 +1,17 @@
 import os
 import dotenv
-from typing import Union
+from typing import Union, TYPE_CHECKING
 from pytz import timezone
-from database import DataBase
+
+if TYPE_CHECKING:
+    from database import DataBase
 
 dotenv.load_dotenv()
 
 
 class Var:
-    db: Union[DataBase, None] = DataBase()
+    # Created once in server.lifespan
+    db: Union["DataBase", None] = None
     IST = timezone("Asia/Kolkata")
 
     ALGORITHM = "HS256"
@@ -17,6 +20,57 @@ class Var:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     R_SECRET_KEY = os.environ.get('R_SECRET_KEY')
     GOOGLE_API_KEYS: list = [k.strip() for k in os.environ.get('GOOGLE_API_KEYS', '').split(' ')]
+    # Per-key Gemini limits used by agents.llm.LLMRouter
+    LLM_RPM = int(os.environ.get('LLM_RPM', 30))
+    LLM_TPM = int(os.environ.get('LLM_TPM', 1_000_000))
+    LLM_MAX_INFLIGHT = int(os.environ.get('LLM_MAX_INFLIGHT', 4))
+    LLM_COOLDOWN = float(os.environ.get('LLM_COOLDOWN', 30))
+    # Opt-in LLM response cache: off | memory | disk | mongo
+    LLM_CACHE = os.environ.get('LLM_CACHE', 'off')
+    LLM_CACHE_TTL = float(os.environ.get('LLM_CACHE_TTL', 3600))
+    LLM_CACHE_SIZE = int(os.environ.get('LLM_CACHE_SIZE', 1024))
+    # Shared outbound HTTP connection pool (utils.http)
+    HTTP_LIMIT = int(os.environ.get('HTTP_LIMIT', 100))
+    HTTP_LIMIT_PER_HOST = int(os.environ.get('HTTP_LIMIT_PER_HOST', 20))
+    # Prompt -> image cache and the disk budget of images/
+    IMAGE_CACHE_SIZE = int(os.environ.get('IMAGE_CACHE_SIZE', 512))
+    IMAGE_CACHE_TTL = float(os.environ.get('IMAGE_CACHE_TTL', 24 * 3600))
+    IMAGES_MAX_BYTES = int(os.environ.get('IMAGES_MAX_BYTES', 1024 ** 3))
+    IMAGE_COST_USD = float(os.environ.get('IMAGE_COST_USD', 0.039))
+    # Telegram Bot API send limits enforced by the per-bot outbox
+    TELEGRAM_GLOBAL_RPS = float(os.environ.get('TELEGRAM_GLOBAL_RPS', 30))
+    TELEGRAM_CHAT_RPS = float(os.environ.get('TELEGRAM_CHAT_RPS', 1))
+    TELEGRAM_GROUP_RPM = float(os.environ.get('TELEGRAM_GROUP_RPM', 20))
+    # Outboxes (file_id cache, rate buckets) kept for bots nobody holds, and for how long
+    TELEGRAM_IDLE_BOTS = int(os.environ.get('TELEGRAM_IDLE_BOTS', 256))
+    TELEGRAM_IDLE_TTL = float(os.environ.get('TELEGRAM_IDLE_TTL', 3600))
+    # Public base URL Telegram should post updates to; empty means shared polling
+    TELEGRAM_WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL', '')
+    TELEGRAM_POLL_INTERVAL = float(os.environ.get('TELEGRAM_POLL_INTERVAL', 1.0))
+    TELEGRAM_POLL_CONCURRENCY = int(os.environ.get('TELEGRAM_POLL_CONCURRENCY', 50))
+    # Trigger dispatch (triggers.dispatch): parallel runs, queue bounds and 'reject' | 'drop_oldest'
+    TRIGGER_CONCURRENCY = int(os.environ.get('TRIGGER_CONCURRENCY', 16))
+    TRIGGER_QUEUE_PER_CHAT = int(os.environ.get('TRIGGER_QUEUE_PER_CHAT', 20))
+    TRIGGER_QUEUE_TOTAL = int(os.environ.get('TRIGGER_QUEUE_TOTAL', 1000))
+    TRIGGER_SHED_POLICY = os.environ.get('TRIGGER_SHED_POLICY', 'reject')
+    # Twilio messages/second per account, and parallel sends per bulk broadcast
+    WHATSAPP_MPS = float(os.environ.get('WHATSAPP_MPS', 10))
+    WHATSAPP_BULK_CONCURRENCY = int(os.environ.get('WHATSAPP_BULK_CONCURRENCY', 20))
+    # Twilio auth token that signs webhook requests (trigger nodes may carry their own)
+    TWILIO_AUTH_TOKEN = os.environ.get('AUTH_TOKEN', '')
+    # Public URL of the WhatsApp webhook as configured in Twilio, when a proxy changes the one we see
+    WHATSAPP_WEBHOOK_URL = os.environ.get('WHATSAPP_WEBHOOK_URL', '')
+    # Where inbound trigger messages wait to be processed: 'mongo' or 'memory'
+    TRIGGER_INBOX = os.environ.get('TRIGGER_INBOX', 'mongo')
+    # Chain RPC and the thread pool for blocking (brownie) chain calls
+    BSC_RPC_URL = os.environ.get('BSC_RPC_URL', 'https://bsc-testnet.infura.io/v3/eab9f2aff8984a57ac11c6043cf87d78')
+    CHAIN_WORKERS = int(os.environ.get('CHAIN_WORKERS', 8))
+    # Transactions per sending account allowed to await their receipts at once
+    TX_MAX_IN_FLIGHT = int(os.environ.get('TX_MAX_IN_FLIGHT', 8))
+    # How `transfer` pays: 'direct' value transfer, 'contract' (FundMe.fundAndTransfer) or 'legacy' fund + transferFunds
+    PAYMENT_MODE = os.environ.get('PAYMENT_MODE', 'direct')
     TEST_MODE = (int(os.environ.get('TEST_MODE', 0)) == 1)
     WORKFLOW_STATUS = {}
-    BASE_URL = os.environ.get('BASE_URL', 'http://localhost')
\ No newline at end of file
+    BASE_URL = os.environ.get('BASE_URL', 'http://localhost')
+    # Connect the chain in the background instead of holding up startup
+    LAZY_STARTUP = (int(os.environ.get('LAZY_STARTUP', 0)) == 1)
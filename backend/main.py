@@ -1,16 +1,18 @@
-from agents.blockchain_agent.api import blockchain_router
+from agents.blockchain_agent.api import blockchain_router, nft_router
+from agents.image_agent.api import image_router, image_files_router
 from server import app
 from auth.api import auth_router
 from user.api import user_router
 from wflow.api import wflow_router
-from fastapi.staticfiles import StaticFiles
+from triggers.api import trigger_router
 app.include_router(wflow_router)
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(blockchain_router)
-
-# Serve static files under /images
-app.mount("/images", StaticFiles(directory="images"), name="images")
+app.include_router(nft_router)
+app.include_router(image_router)
+app.include_router(image_files_router)
+app.include_router(trigger_router)
 
 @app.get("/test")
 async def root():
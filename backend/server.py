@@ -1,8 +1,15 @@
+import asyncio
 import traceback
 from agents.blockchain_agent.blockchain import start_blockchain_funcs
-from triggers.telegram_trigger import start_telegram_trigger
+from agents.blockchain_agent.chain import chain
+from triggers.telegram_trigger import start_telegram_trigger, telegram_triggers
+from triggers.dispatch import trigger_dispatcher
+from triggers.whatsapp_trigger import start_whatsapp_trigger, whatsapp_triggers
 from globar_vars import Var
 from database import DataBase
+from agents.pool import agent_pool
+from utils.http import http_sessions
+from agents.telegram_agent.bot_pool import bot_registry
 from fastapi import FastAPI, Request
 from pydantic import ValidationError
 from responses import StandardException
@@ -11,13 +18,36 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 
+def _log_chain_init(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        exc = task.exception()
+        print(f"Blockchain init failed, chain tools stay unavailable: {exc!r}")
+        traceback.print_exception(type(exc), exc, exc.__traceback__)
+
+
 # ON STARTUP FUNCTION
 @asynccontextmanager
 async def lifespan(_fastapi: FastAPI):
     Var.db = DataBase()
-    await start_telegram_trigger()
-    await start_blockchain_funcs()
+    if Var.LAZY_STARTUP:
+        # Serve requests right away; chain tools report "not initialized" until this finishes.
+        # Keep the task so it isn't garbage-collected mid-way and can be cancelled on shutdown
+        _fastapi.state.chain_init = asyncio.create_task(start_blockchain_funcs())
+        _fastapi.state.chain_init.add_done_callback(_log_chain_init)
+        await asyncio.gather(start_telegram_trigger(), start_whatsapp_trigger())
+    else:
+        await asyncio.gather(start_telegram_trigger(), start_whatsapp_trigger(), start_blockchain_funcs())
     yield
+    chain_init = getattr(_fastapi.state, 'chain_init', None)
+    if chain_init is not None and not chain_init.done():
+        chain_init.cancel()
+    await telegram_triggers.stop()
+    await whatsapp_triggers.stop()
+    await trigger_dispatcher.close()
+    await agent_pool.close()
+    await bot_registry.close_all()
+    await http_sessions.close()
+    chain.close()
 
 
 # Shutdown event
@@ -0,0 +1,48 @@
+from typing import Optional
+
+from fastapi import APIRouter, Header, Request, Response
+
+from globar_vars import Var
+from responses import StandardException
+from triggers.telegram_trigger import telegram_triggers
+from triggers.dispatch import trigger_dispatcher
+from triggers.whatsapp_trigger import whatsapp_triggers
+
+trigger_router = APIRouter(prefix='/v1/triggers', tags=["triggers"])
+
+
+@trigger_router.post('/telegram/{bot_key}')
+async def telegram_webhook(bot_key: str, request: Request,
+                           secret: Optional[str] = Header(None, alias='X-Telegram-Bot-Api-Secret-Token')):
+    token = telegram_triggers.token_for(bot_key, secret)
+    if token is None:
+        raise StandardException(status_code=404, details='unknown bot', message='unknown bot')
+    # Workflows run in the background so Telegram gets its answer right away
+    telegram_triggers.feed_webhook(token, await request.json())
+    return {}
+
+
+@trigger_router.post('/whatsapp')
+async def whatsapp_webhook(request: Request, signature: Optional[str] = Header(None, alias='X-Twilio-Signature')):
+    form = dict(await request.form())
+    # Twilio signs the URL it was configured with, which a proxy may have rewritten
+    if not whatsapp_triggers.verify(Var.WHATSAPP_WEBHOOK_URL or str(request.url), form, signature):
+        raise StandardException(status_code=403, details='invalid Twilio signature', message='invalid signature')
+    # Only store the message here; Twilio gets its empty TwiML answer right away
+    await whatsapp_triggers.receive(form)
+    return Response(content='<Response/>', media_type='application/xml')
+
+
+@trigger_router.get('/whatsapp/stats')
+async def whatsapp_trigger_stats():
+    return whatsapp_triggers.stats
+
+
+@trigger_router.get('/telegram/stats')
+async def telegram_trigger_stats():
+    return telegram_triggers.stats
+
+
+@trigger_router.get('/dispatch/stats')
+async def trigger_dispatch_stats():
+    return trigger_dispatcher.metrics()
@@ -0,0 +1,127 @@
+import time
+import asyncio
+import collections
+from typing import Awaitable, Callable, Hashable, Optional
+
+from globar_vars import Var
+
+
+class TriggerDispatcher:
+    """Runs trigger jobs in order per chat and in parallel across chats.
+
+    Each chat (any hashable key) has its own bounded queue, drained by a task
+    that exists only while the queue is non-empty. Every job also takes a slot
+    of a global semaphore; its waiters are served first come first served, so a
+    chat that floods the queue gets one slot at a time like everyone else.
+
+    When a chat's queue or the total backlog is full the job is shed: with the
+    'reject' policy the new job is refused, with 'drop_oldest' the chat's oldest
+    waiting job makes room for it (only the per-chat bound; a full backlog
+    always rejects). Shed jobs get their `on_shed` callback.
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_per_chat: int = 20, max_pending: int = 1000,
+                 policy: str = 'reject'):
+        if policy not in ('reject', 'drop_oldest'):
+            raise ValueError(f"unknown shedding policy '{policy}'")
+        self.max_per_chat = max_per_chat
+        self.max_pending = max_pending
+        self.policy = policy
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        # chat -> deque of (job, on_shed, enqueued_at)
+        self._queues = {}
+        self._workers = {}
+        self._pending = 0
+        self._running = 0
+        self._wait_total = 0.0
+        self.stats = {'submitted': 0, 'completed': 0, 'failed': 0, 'shed': 0, 'max_depth': 0}
+
+    def submit(self, chat: Hashable, job: Callable[[], Awaitable], on_shed: Optional[Callable[[], None]] = None) -> bool:
+        """Queues `job` (called with no arguments once its turn comes); False if it was shed."""
+        queue = self._queues.setdefault(chat, collections.deque())
+        if self._pending >= self.max_pending:
+            return self._shed(chat, on_shed)
+        if len(queue) >= self.max_per_chat:
+            if self.policy == 'reject':
+                return self._shed(chat, on_shed)
+            _, dropped_on_shed, _ = queue.popleft()
+            self._pending -= 1
+            self._shed(chat, dropped_on_shed)
+
+        queue.append((job, on_shed, time.monotonic()))
+        self._pending += 1
+        self.stats['submitted'] += 1
+        self.stats['max_depth'] = max(self.stats['max_depth'], len(queue))
+        if chat not in self._workers:
+            self._workers[chat] = asyncio.create_task(self._drain(chat))
+        return True
+
+    def _shed(self, chat: Hashable, on_shed) -> bool:
+        self.stats['shed'] += 1
+        if not self._queues.get(chat) and chat not in self._workers:
+            self._queues.pop(chat, None)
+        if on_shed is not None:
+            try:
+                on_shed()
+            except Exception as e:
+                print(f"Trigger dispatch: on_shed failed: {e}")
+        return False
+
+    async def _drain(self, chat: Hashable):
+        queue = self._queues[chat]
+        try:
+            while queue:
+                async with self._slots:
+                    # The job may have been dropped while we waited for a slot
+                    if not queue:
+                        break
+                    job, _, enqueued_at = queue.popleft()
+                    self._pending -= 1
+                    self._wait_total += time.monotonic() - enqueued_at
+                    self._running += 1
+                    try:
+                        await job()
+                        self.stats['completed'] += 1
+                    except Exception as e:
+                        self.stats['failed'] += 1
+                        print(f"Trigger dispatch: job for {chat} failed: {e}")
+                    finally:
+                        self._running -= 1
+        finally:
+            self._workers.pop(chat, None)
+            if not queue and self._queues.get(chat) is queue:
+                del self._queues[chat]
+
+    @property
+    def full(self) -> bool:
+        return self._pending >= self.max_pending
+
+    def chat_full(self, chat: Hashable) -> bool:
+        """Whether a new job for `chat` would be shed (or push out its oldest job)."""
+        return len(self._queues.get(chat, ())) >= self.max_per_chat
+
+    def metrics(self) -> dict:
+        started = self.stats['completed'] + self.stats['failed'] + self._running
+        return {
+            **self.stats,
+            'pending': self._pending,
+            'running': self._running,
+            'chats': len(self._queues),
+            'max_concurrency': self.max_concurrency,
+            'avg_wait_s': round(self._wait_total / started, 4) if started else 0.0,
+        }
+
+    async def close(self):
+        for task in list(self._workers.values()):
+            task.cancel()
+        self._queues.clear()
+        self._pending = 0
+
+
+trigger_dispatcher = TriggerDispatcher(
+    max_concurrency=Var.TRIGGER_CONCURRENCY,
+    max_per_chat=Var.TRIGGER_QUEUE_PER_CHAT,
+    max_pending=Var.TRIGGER_QUEUE_TOTAL,
+    policy=Var.TRIGGER_SHED_POLICY,
+)
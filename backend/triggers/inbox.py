@@ -0,0 +1,103 @@
+import time
+import datetime
+import collections
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from globar_vars import Var
+
+
+class MongoInbox:
+    """Durable queue of inbound messages in a Mongo collection.
+
+    Documents are keyed by the provider's message id, so a webhook retried by
+    the provider is rejected by the unique `_id` instead of running twice.
+    A message is `pending` until a worker claims it (`processing`) and then
+    `done`, `failed` or `unrouted`, or goes back to `pending` via requeue(). Messages left `processing` by a crash go back
+    to `pending` on startup; finished ones expire after `retention` seconds.
+    """
+
+    def __init__(self, name: str, retention: float = 7 * 86400):
+        self.name = name
+        self.retention = retention
+
+    @property
+    def collection(self):
+        return Var.db.db[self.name]
+
+    async def setup(self) -> int:
+        """Creates indexes and re-queues interrupted messages; returns how many were re-queued."""
+        await self.collection.create_index('received_at', expireAfterSeconds=int(self.retention))
+        await self.collection.create_index([('status', 1), ('received_at', 1)])
+        result = await self.collection.update_many({'status': 'processing'}, {'$set': {'status': 'pending'}})
+        return result.modified_count
+
+    async def push(self, message_id: str, payload: dict) -> bool:
+        """Stores a new message; False if this id was seen before."""
+        try:
+            await self.collection.insert_one({
+                '_id': message_id,
+                'payload': payload,
+                'status': 'pending',
+                'received_at': datetime.datetime.now(datetime.timezone.utc),
+            })
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def claim(self) -> Optional[dict]:
+        """Oldest pending message, marked as processing."""
+        doc = await self.collection.find_one_and_update(
+            {'status': 'pending'},
+            {'$set': {'status': 'processing'}},
+            sort=[('received_at', 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return {'_id': doc['_id'], 'payload': doc['payload']} if doc else None
+
+    async def finish(self, message_id: str, status: str = 'done'):
+        await self.collection.update_one({'_id': message_id}, {'$set': {'status': status}})
+
+    async def requeue(self, message_id: str, payload: dict):
+        """Hands a claimed message back to be claimed again later."""
+        await self.collection.update_one({'_id': message_id, 'status': 'processing'}, {'$set': {'status': 'pending'}})
+
+
+class MemoryInbox:
+    """In-process stand-in for MongoInbox; nothing survives a restart."""
+
+    def __init__(self, name: str, remember: int = 10000):
+        self.name = name
+        self.remember = remember
+        self._pending = collections.deque()
+        # message id -> received time, for dedup
+        self._seen = collections.OrderedDict()
+
+    async def setup(self) -> int:
+        return 0
+
+    async def push(self, message_id: str, payload: dict) -> bool:
+        if message_id in self._seen:
+            return False
+        self._seen[message_id] = time.time()
+        while len(self._seen) > self.remember:
+            self._seen.popitem(last=False)
+        self._pending.append({'_id': message_id, 'payload': payload})
+        return True
+
+    async def claim(self) -> Optional[dict]:
+        return self._pending.popleft() if self._pending else None
+
+    async def finish(self, message_id: str, status: str = 'done'):
+        pass
+
+    async def requeue(self, message_id: str, payload: dict):
+        self._pending.append({'_id': message_id, 'payload': payload})
+
+
+def make_inbox(name: str):
+    if Var.TRIGGER_INBOX == 'mongo':
+        return MongoInbox(name)
+    return MemoryInbox(name)
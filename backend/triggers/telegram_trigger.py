@@ -1,82 +1,268 @@
 import asyncio
-from aiogram import Bot, Dispatcher
-from aiogram.types import Message
-from aiogram.enums import ParseMode
-from aiogram.client.bot import DefaultBotProperties
-from wflow.schemas import Node, WFlow, sample_workflow, telegram_blockchain_workflow
-from aiogram import Bot, Dispatcher, types
-from aiogram.types import Message
-from aiogram.filters import CommandStart
-from aiogram.enums import ParseMode
-from aiogram.client.bot import DefaultBotProperties
-import asyncio
+import hashlib
 import logging
+from typing import Optional
+
+from aiogram.types import Message, Update
+from aiogram.utils.token import TokenValidationError, validate_token
 
-from wflow.schemas import sample_workflow2
+from globar_vars import Var
+from wflow.schemas import WFlow
 from wflow.wflow import WorkflowExecutor
+from wflow.plan import ExecutionPlan, PlanError, get_plan
+from agents.telegram_agent.bot_pool import bot_registry
+from triggers.dispatch import TriggerDispatcher, trigger_dispatcher
 
 # Enable logging
 logging.basicConfig(level=logging.INFO)
 
-# Replace with your actual bot token
-BOT_TOKEN = "1765542474:AAHpERwNgs7o9_qkxmkaDqwOhN5T9efmSSs"
+TRIGGER_CLASS = 'TelegramTrigger'
 
-# Initialize bot and dispatcher
-bot = Bot(
-    token=BOT_TOKEN,
-    default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-)
-dp = Dispatcher(bot=bot)
 
+def bot_key(token: str) -> str:
+    """Public identifier of a bot in webhook URLs, so the token itself never shows up in them."""
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def webhook_secret(token: str) -> str:
+    # Telegram echoes this back in X-Telegram-Bot-Api-Secret-Token
+    return hashlib.sha256(f'webhook:{token}'.encode()).hexdigest()
+
+
+def trigger_tokens(wflow: WFlow) -> list[tuple[str, str]]:
+    """(bot_token, node_id) for every TelegramTrigger node that has a well-formed bot token."""
+    routes = []
+    for node in wflow.nodes:
+        if node.node_class != TRIGGER_CLASS:
+            continue
+        token = next((cred['bot_token'] for cred in node.creds if cred.get('bot_token')), None)
+        if not token:
+            continue
+        try:
+            validate_token(token)
+        except TokenValidationError:
+            # aiogram refuses to build a Bot for it; skip the node rather than fail the whole workflow
+            print(f"Telegram trigger: workflow {wflow.wflow_id} node {node.node_id} has a malformed bot token")
+            continue
+        routes.append((token, node.node_id))
+    return routes
+
+
+class TelegramTriggerService:
+    """Routes Telegram updates for every bot found in stored workflows.
+
+    The routing index maps a bot token to the (workflow, trigger node) pairs it
+    starts, and is kept up to date as workflows are saved. With
+    TELEGRAM_WEBHOOK_URL set each bot gets a webhook pointing at
+    /v1/triggers/telegram/{bot_key}; otherwise a single task polls all bots in
+    rounds, so the number of bots doesn't decide the number of tasks.
+
+    Updates are handed to the dispatcher keyed by (bot, chat), so each chat's
+    messages run in order while different chats run in parallel.
+    """
+
+    def __init__(self, dispatcher: TriggerDispatcher, webhook_url: str = '', poll_interval: float = 1.0,
+                 poll_concurrency: int = 50):
+        self.dispatcher = dispatcher
+        self.webhook_url = webhook_url.rstrip('/')
+        self.poll_interval = poll_interval
+        self._poll_limit = asyncio.Semaphore(poll_concurrency)
+        # token -> {(wflow_id, node_id): (wflow, plan)}
+        self._routes = {}
+        # wflow_id -> tokens it is routed from
+        self._wflow_tokens = {}
+        # bot_key -> token
+        self._keys = {}
+        # token -> next getUpdates offset, for bots served by polling
+        self._offsets = {}
+        self._poller: Optional[asyncio.Task] = None
+        self._tasks = set()
+        self.stats = {'updates': 0, 'runs': 0, 'failed': 0}
+
+    @property
+    def use_webhooks(self) -> bool:
+        return bool(self.webhook_url)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(self._quietly(coro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    @staticmethod
+    async def _quietly(coro):
+        try:
+            await coro
+        except Exception as e:
+            print(f"Telegram trigger task failed: {e}")
+
+    async def start(self):
+        """Builds the routing index from every stored workflow with a TelegramTrigger."""
+        for wflow in await Var.db.find_wflows_by_trigger(TRIGGER_CLASS):
+            self.update_workflow(wflow)
+        if not self.use_webhooks:
+            self._poller = asyncio.create_task(self._poll_loop())
+        print(f"Telegram triggers: {len(self._routes)} bots, {len(self._wflow_tokens)} workflows")
 
-# Echo handler
-@dp.message()
-async def echo(message: Message):
-    query = message.text
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+        for task in list(self._tasks):
+            task.cancel()
+        for token in list(self._routes):
+            bot_registry.release(token)
+        self._routes.clear()
+        self._wflow_tokens.clear()
+        self._keys.clear()
+        self._offsets.clear()
 
-    runnable = WorkflowExecutor(workflow=telegram_blockchain_workflow)
-    await runnable.execute(query)
+    def update_workflow(self, wflow: WFlow):
+        """(Re)indexes a workflow after it is created or saved, compiling its plan once for all its runs."""
+        routes = trigger_tokens(wflow)
+        if not routes:
+            self.remove_workflow(wflow.wflow_id)
+            return
+        try:
+            plan = get_plan(wflow)
+        except PlanError as e:
+            # Not routed until it is saved in a runnable state
+            print(f"Telegram trigger: workflow {wflow.wflow_id} is invalid: {e.problems}")
+            self.remove_workflow(wflow.wflow_id)
+            return
+        self._reindex(wflow.wflow_id, (wflow, plan), routes)
 
-    await message.answer(f"Workflow Execution Finished!")
+    def remove_workflow(self, wflow_id: str):
+        self._reindex(wflow_id, None, [])
+
+    def _reindex(self, wflow_id: str, target: Optional[tuple[WFlow, ExecutionPlan]], routes: list[tuple[str, str]]):
+        old_tokens = self._wflow_tokens.pop(wflow_id, set())
+        for token in old_tokens:
+            bot_routes = self._routes[token]
+            for route in [route for route in bot_routes if route[0] == wflow_id]:
+                del bot_routes[route]
+        for token, node_id in routes:
+            if token not in self._routes:
+                try:
+                    self._activate(token)
+                except Exception as e:
+                    print(f"Telegram trigger: can't serve bot {bot_key(token)[:8]} of workflow {wflow_id}: {e}")
+                    continue
+                self._routes[token] = {}
+            self._routes[token][(wflow_id, node_id)] = target
+            self._wflow_tokens.setdefault(wflow_id, set()).add(token)
+        # Bots this workflow was the last user of; done last so a kept bot isn't torn down and set up again
+        for token in old_tokens:
+            if not self._routes[token]:
+                del self._routes[token]
+                self._deactivate(token)
+
+    def _activate(self, token: str):
+        bot = bot_registry.acquire(token)
+        self._keys[bot_key(token)] = token
+        if self.use_webhooks:
+            self._spawn(bot.set_webhook(
+                f'{self.webhook_url}/v1/triggers/telegram/{bot_key(token)}',
+                secret_token=webhook_secret(token),
+                allowed_updates=['message'],
+            ))
+        else:
+            self._offsets[token] = None
+            # getUpdates is refused while a webhook is set
+            self._spawn(bot.delete_webhook())
+
+    def _deactivate(self, token: str):
+        self._keys.pop(bot_key(token), None)
+        self._offsets.pop(token, None)
+        if self.use_webhooks:
+            bot = bot_registry.get(token)
+            if bot is not None:
+                self._spawn(bot.delete_webhook())
+        bot_registry.release(token)
+
+    def token_for(self, key: str, secret: Optional[str]) -> Optional[str]:
+        """The bot token behind a webhook path, if the secret header matches."""
+        token = self._keys.get(key)
+        if token is None or secret != webhook_secret(token):
+            return None
+        return token
+
+    def feed_webhook(self, token: str, data: dict):
+        bot = bot_registry.get(token)
+        if bot is None:
+            return
+        self.handle_update(token, Update.model_validate(data, context={'bot': bot}))
+
+    def handle_update(self, token: str, update: Update):
+        message = update.message
+        if message is None or not message.text:
+            return
+        routes = list(self._routes.get(token, {}).items())
+        if not routes:
+            return
+        self.stats['updates'] += 1
+        self.dispatcher.submit(
+            (bot_key(token), message.chat.id),
+            lambda: self._run_routes(token, routes, message),
+            on_shed=lambda: self._spawn(self._reply_busy(token, message.chat.id)),
+        )
+
+    async def _run_routes(self, token: str, routes: list, message: Message):
+        # All workflows of one update count as a single job for the chat
+        await asyncio.gather(*(self._run(token, wflow, plan, node_id, message)
+                               for (_, node_id), (wflow, plan) in routes))
+
+    @staticmethod
+    async def _reply(token: str, chat_id: int, text: str):
+        # Through the bot's outbox, so trigger replies count against its flood limits too
+        outbox = bot_registry.outbox(token) if bot_registry.get(token) else None
+        if outbox is not None:
+            await outbox.send_message(chat_id, text)
+
+    async def _reply_busy(self, token: str, chat_id: int):
+        await self._reply(token, chat_id, "Too many requests right now, please try again in a moment.")
+
+    async def _run(self, token: str, wflow: WFlow, plan: ExecutionPlan, node_id: str, message: Message):
+        try:
+            executor = WorkflowExecutor(workflow=wflow, plan=plan)
+            self.stats['runs'] += 1
+            await executor.execute(message.text, trigger_id=node_id)
+            await self._reply(token, message.chat.id, "Workflow Execution Finished!")
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"Telegram trigger: workflow {wflow.wflow_id} failed: {e}")
+
+    async def _poll_one(self, token: str) -> bool:
+        bot = bot_registry.get(token)
+        if bot is None or token not in self._offsets:
+            return False
+        async with self._poll_limit:
+            try:
+                updates = await bot.get_updates(offset=self._offsets[token], timeout=0, allowed_updates=['message'])
+            except Exception as e:
+                print(f"Telegram polling failed for bot {bot_key(token)[:8]}: {e}")
+                return False
+        if token not in self._offsets:
+            return False
+        for update in updates:
+            self._offsets[token] = update.update_id + 1
+            self.handle_update(token, update)
+        return bool(updates)
+
+    async def _poll_loop(self):
+        # One short getUpdates per bot per round instead of a long-poll task per bot
+        while True:
+            results = await asyncio.gather(*(self._poll_one(token) for token in list(self._offsets)))
+            if not any(results):
+                await asyncio.sleep(self.poll_interval)
+
+
+telegram_triggers = TelegramTriggerService(
+    trigger_dispatcher,
+    webhook_url=Var.TELEGRAM_WEBHOOK_URL,
+    poll_interval=Var.TELEGRAM_POLL_INTERVAL,
+    poll_concurrency=Var.TELEGRAM_POLL_CONCURRENCY,
+)
 
 
-# Main function to run the bot
 async def start_telegram_trigger():
-    asyncio.create_task(dp.start_polling(bot))
-
-# class BaseTrigger:
-#     def __init__(self, node: Node, wflow: WFlow, workflow_registry):
-#         self.node = node
-#         self.wflow = wflow
-#         self.workflow_registry = workflow_registry
-#
-#     async def start(self):
-#         raise NotImplementedError
-#
-# class TelegramTrigger(BaseTrigger):
-#     def __init__(self, node: Node, wflow: WFlow, workflow_registry):
-#         super().__init__(node, wflow, workflow_registry)
-#         self.bot_token = node.creds[0]['bot_token']
-#         self.bot = Bot(token=self.bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-#         self.dp = Dispatcher()  # Initialize empty dispatcher
-#         self.dp.include_router(self._get_router())  # ✅ Add router manually
-#
-#     def _get_router(self):
-#         from aiogram import Router
-#         router = Router()
-#
-#         @router.message()
-#         async def handle_message(message: Message):
-#             print("Received message:", message.text)
-#             query = message.text
-#
-#             runnable = self.workflow_registry[self.wflow.wflow_id]
-#             final_output = await runnable.run(self.node.node_id, query)
-#
-#             await message.answer(f"Workflow complete.\n\nOutput:\n{final_output}")
-#
-#         return router
-#
-#     async def start(self):
-#         print('polling starteeeeeeeeeeeeeeeeeeeeeeeeeed')
-#         asyncio.create_task(self.dp.start_polling(self.bot))  # ✅ Pass bot here explicitly
+    await telegram_triggers.start()
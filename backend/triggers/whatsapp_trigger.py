@@ -1,82 +1,221 @@
+import hmac
+import base64
 import asyncio
-from aiogram import Bot, Dispatcher
-from aiogram.types import Message
-from aiogram.enums import ParseMode
-from aiogram.client.bot import DefaultBotProperties
-from wflow.schemas import Node, WFlow, sample_workflow, telegram_blockchain_workflow
-from aiogram import Bot, Dispatcher, types
-from aiogram.types import Message
-from aiogram.filters import CommandStart
-from aiogram.enums import ParseMode
-from aiogram.client.bot import DefaultBotProperties
-import asyncio
-import logging
+import hashlib
+import collections
+from typing import Optional
 
-from wflow.schemas import sample_workflow2
+from globar_vars import Var
+from wflow.schemas import WFlow
 from wflow.wflow import WorkflowExecutor
+from wflow.plan import ExecutionPlan, PlanError, get_plan
+from triggers.dispatch import TriggerDispatcher, trigger_dispatcher
+from triggers.inbox import make_inbox
+
+TRIGGER_CLASS = 'WhatsappTrigger'
+
+
+def normalize_number(number: str) -> str:
+    return number.removeprefix('whatsapp:').strip()
+
+
+def trigger_numbers(wflow: WFlow) -> list[tuple[str, str]]:
+    """(receiving number, node_id) for every WhatsappTrigger node that names its number."""
+    routes = []
+    for node in wflow.nodes:
+        if node.node_class != TRIGGER_CLASS:
+            continue
+        number = next((cred['whatsapp_number'] for cred in node.creds if cred.get('whatsapp_number')), None)
+        # Without a number the node would start on messages sent to anyone's number
+        if number:
+            routes.append((normalize_number(number), node.node_id))
+    return routes
+
+
+def twilio_signature(auth_token: str, url: str, params: dict) -> str:
+    """X-Twilio-Signature of a form POST: HMAC-SHA1 of the URL followed by the sorted params."""
+    data = url + ''.join(f'{key}{params[key]}' for key in sorted(params))
+    return base64.b64encode(hmac.new(auth_token.encode(), data.encode(), hashlib.sha1).digest()).decode()
+
+
+class WhatsappTriggerService:
+    """Starts deployed workflows from inbound WhatsApp messages.
+
+    The Twilio webhook only stores the message in the inbox (deduplicated by
+    MessageSid) and returns, so its latency doesn't depend on the workflows.
+    A background worker claims stored messages and hands them to the
+    dispatcher, keyed by sender, which runs every workflow whose
+    WhatsappTrigger matches the receiving number.
+
+    Stored messages are never shed. While a sender's dispatcher queue is full
+    their claimed messages are held here, still `processing` in the inbox, and
+    fed to the dispatcher one by one as that sender's jobs finish.
+    """
+
+    def __init__(self, dispatcher: TriggerDispatcher):
+        self.dispatcher = dispatcher
+        self.inbox = make_inbox('wa_inbox')
+        # number -> {(wflow_id, node_id): (wflow, plan)}
+        self._routes = {}
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        # sender -> claimed (message_id, routes, payload) waiting for room in their dispatcher queue
+        self._held = {}
+        self._held_count = 0
+        self.stats = {'received': 0, 'duplicates': 0, 'runs': 0, 'failed': 0, 'unrouted': 0, 'held': 0,
+                      'requeued': 0}
+
+    async def start(self):
+        for wflow in await Var.db.find_wflows_by_trigger(TRIGGER_CLASS):
+            self.update_workflow(wflow)
+        requeued = await self.inbox.setup()
+        self._worker = asyncio.create_task(self._work())
+        print(f"Whatsapp triggers: {len(self._routes)} numbers, {requeued} messages re-queued")
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        self._routes.clear()
+        # Held messages are still `processing` and go back to `pending` on the next start
+        self._held.clear()
+        self._held_count = 0
+
+    def update_workflow(self, wflow: WFlow):
+        """(Re)indexes a workflow after it is created or saved, compiling its plan once for all its runs."""
+        self.remove_workflow(wflow.wflow_id)
+        routes = trigger_numbers(wflow)
+        if not routes:
+            return
+        try:
+            plan = get_plan(wflow)
+        except PlanError as e:
+            # Not routed until it is saved in a runnable state
+            print(f"Whatsapp trigger: workflow {wflow.wflow_id} is invalid: {e.problems}")
+            return
+        for number, node_id in routes:
+            self._routes.setdefault(number, {})[(wflow.wflow_id, node_id)] = (wflow, plan)
+
+    def remove_workflow(self, wflow_id: str):
+        for number in list(self._routes):
+            routes = self._routes[number]
+            for route in [route for route in routes if route[0] == wflow_id]:
+                del routes[route]
+            if not routes:
+                del self._routes[number]
+
+    def auth_tokens(self, number: str) -> set[str]:
+        """Twilio auth tokens that may sign a message to `number`: the global one and its trigger nodes'."""
+        tokens = {Var.TWILIO_AUTH_TOKEN} if Var.TWILIO_AUTH_TOKEN else set()
+        for (_, node_id), (wflow, _) in self._routes.get(normalize_number(number), {}).items():
+            node = next((node for node in wflow.nodes if node.node_id == node_id), None)
+            if node is not None:
+                tokens.update(cred['auth_token'] for cred in node.creds if cred.get('auth_token'))
+        return tokens
+
+    def verify(self, url: str, form: dict, signature: Optional[str]) -> bool:
+        """Whether a webhook request really comes from Twilio."""
+        if not signature:
+            return False
+        return any(hmac.compare_digest(twilio_signature(token, url, form), signature)
+                   for token in self.auth_tokens(form.get('To', '')))
+
+    async def receive(self, form: dict) -> bool:
+        """Stores a webhook payload; False for a Twilio retry of a message we already have."""
+        message_id = form.get('MessageSid') or form.get('SmsMessageSid')
+        if not message_id:
+            return False
+        if not await self.inbox.push(message_id, form):
+            self.stats['duplicates'] += 1
+            return False
+        self.stats['received'] += 1
+        self._wakeup.set()
+        return True
+
+    async def _work(self):
+        while True:
+            if self.dispatcher.full or self._held_count >= self.dispatcher.max_pending:
+                # Leave messages in the inbox rather than have the dispatcher shed them
+                await asyncio.sleep(0.5)
+                continue
+            self._wakeup.clear()
+            try:
+                doc = await self.inbox.claim()
+            except Exception as e:
+                print(f"Whatsapp trigger: inbox claim failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if doc is None:
+                # Also poll now and then, in case another process stored messages
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._dispatch(doc['_id'], doc['payload'])
+
+    def _dispatch(self, message_id: str, payload: dict):
+        number = normalize_number(payload.get('To', ''))
+        routes = list(self._routes.get(number, {}).items())
+        if not routes:
+            self.stats['unrouted'] += 1
+            asyncio.create_task(self.inbox.finish(message_id, 'unrouted'))
+            return
+        chat = ('wa', payload.get('From'))
+        if chat in self._held or self.dispatcher.chat_full(chat):
+            # Queue behind the sender's earlier held messages so their order is kept
+            self._held.setdefault(chat, collections.deque()).append((message_id, routes, payload))
+            self._held_count += 1
+            self.stats['held'] += 1
+            return
+        self._submit(chat, message_id, routes, payload)
+
+    def _submit(self, chat: tuple, message_id: str, routes: list, payload: dict):
+        self.dispatcher.submit(
+            chat,
+            lambda: self._run_routes(chat, message_id, routes, payload),
+            # Only a backlog filled by other triggers gets here; try the message again later
+            on_shed=lambda: asyncio.create_task(self._requeue(message_id, payload)),
+        )
+
+    async def _requeue(self, message_id: str, payload: dict):
+        self.stats['requeued'] += 1
+        await self.inbox.requeue(message_id, payload)
+
+    def _release_held(self, chat: tuple):
+        held = self._held.get(chat)
+        # Nothing to hand over, or we are shutting down
+        if not held or self._worker is None:
+            return
+        message_id, routes, payload = held.popleft()
+        self._held_count -= 1
+        if not held:
+            del self._held[chat]
+        self._submit(chat, message_id, routes, payload)
+
+    async def _run_routes(self, chat: tuple, message_id: str, routes: list, payload: dict):
+        try:
+            results = await asyncio.gather(*(self._run(wflow, plan, node_id, payload)
+                                             for (_, node_id), (wflow, plan) in routes))
+            await self.inbox.finish(message_id, 'done' if all(results) else 'failed')
+        finally:
+            # This job's slot in the sender's queue is free again
+            self._release_held(chat)
+
+    async def _run(self, wflow: WFlow, plan: ExecutionPlan, node_id: str, payload: dict) -> bool:
+        try:
+            executor = WorkflowExecutor(workflow=wflow, plan=plan)
+            self.stats['runs'] += 1
+            await executor.execute(payload.get('Body', ''), trigger_id=node_id)
+            return True
+        except Exception as e:
+            print(f"Whatsapp trigger: workflow {wflow.wflow_id} failed: {e}")
+        self.stats['failed'] += 1
+        return False
+
+
+whatsapp_triggers = WhatsappTriggerService(trigger_dispatcher)
+
 
-# Enable logging
-logging.basicConfig(level=logging.INFO)
-
-# Replace with your actual bot token
-BOT_TOKEN = "1765542474:AAHpERwNgs7o9_qkxmkaDqwOhN5T9efmSSs"
-
-# Initialize bot and dispatcher
-bot = Bot(
-    token=BOT_TOKEN,
-    default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-)
-dp = Dispatcher(bot=bot)
-
-
-# Echo handler
-@dp.message()
-async def echo(message: Message):
-    query = message.text
-
-    runnable = WorkflowExecutor(workflow=telegram_blockchain_workflow)
-    await runnable.execute(query)
-
-    await message.answer(f"Workflow Execution Finished!")
-
-
-# Main function to run the bot
-async def start_telegram_trigger():
-    asyncio.create_task(dp.start_polling(bot))
-
-# class BaseTrigger:
-#     def __init__(self, node: Node, wflow: WFlow, workflow_registry):
-#         self.node = node
-#         self.wflow = wflow
-#         self.workflow_registry = workflow_registry
-#
-#     async def start(self):
-#         raise NotImplementedError
-#
-# class TelegramTrigger(BaseTrigger):
-#     def __init__(self, node: Node, wflow: WFlow, workflow_registry):
-#         super().__init__(node, wflow, workflow_registry)
-#         self.bot_token = node.creds[0]['bot_token']
-#         self.bot = Bot(token=self.bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-#         self.dp = Dispatcher()  # Initialize empty dispatcher
-#         self.dp.include_router(self._get_router())  # ✅ Add router manually
-#
-#     def _get_router(self):
-#         from aiogram import Router
-#         router = Router()
-#
-#         @router.message()
-#         async def handle_message(message: Message):
-#             print("Received message:", message.text)
-#             query = message.text
-#
-#             runnable = self.workflow_registry[self.wflow.wflow_id]
-#             final_output = await runnable.run(self.node.node_id, query)
-#
-#             await message.answer(f"Workflow complete.\n\nOutput:\n{final_output}")
-#
-#         return router
-#
-#     async def start(self):
-#         print('polling starteeeeeeeeeeeeeeeeeeeeeeeeeed')
-#         asyncio.create_task(self.dp.start_polling(self.bot))  # ✅ Pass bot here explicitly
+async def start_whatsapp_trigger():
+    await whatsapp_triggers.start()
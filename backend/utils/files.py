@@ -0,0 +1,26 @@
+import os
+import tempfile
+from typing import IO, Callable
+
+
+def atomic_write(path: str, write: Callable[[IO], None], mode: str = 'wb'):
+    """Writes `path` through a temp file next to it that is renamed into place.
+
+    Readers never see a partial file. Every writer gets its own uniquely named
+    temp file, so concurrent writers of the same path (threads or processes)
+    don't trip over each other; the last rename wins.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f'{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        # mkstemp creates the file owner-only; give it the permissions a plain open() would
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+        raise
@@ -0,0 +1,48 @@
+from typing import Optional
+
+import aiohttp
+
+from globar_vars import Var
+
+
+class HttpSessionManager:
+    """One keep-alive aiohttp session for the whole process.
+
+    Reusing the session keeps TCP/TLS connections to the same hosts open, caches
+    DNS lookups and bounds the number of connections per host. Closed from the
+    FastAPI lifespan on shutdown.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 20, dns_ttl: int = 300, keepalive: float = 30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive = keepalive
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def get_session(self) -> aiohttp.ClientSession:
+        # Created lazily because a session must be built inside the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=120, connect=10),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+http_sessions = HttpSessionManager(limit=Var.HTTP_LIMIT, limit_per_host=Var.HTTP_LIMIT_PER_HOST)
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    return http_sessions.get_session()
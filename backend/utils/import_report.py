@@ -0,0 +1,75 @@
+"""
+Import-time report for server cold starts.
+
+Imports a module in a fresh interpreter with `-X importtime` and summarises
+where the time went, per module and per top-level package.
+
+Run from backend/:
+    python -m utils.import_report [module] [--top N] [--json]
+"""
+import sys
+import json
+import argparse
+import subprocess
+import collections
+
+
+def measure(module: str = 'main') -> list[dict]:
+    """Returns one entry per imported module with its self and cumulative time in microseconds."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        # import time:       self [us] |  cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append({
+            'module': name.strip(),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+            'self_us': int(self_us),
+            'cumulative_us': int(cumulative_us),
+        })
+    return entries
+
+
+def summarise(entries: list[dict], top: int = 20) -> dict:
+    by_package = collections.Counter()
+    for entry in entries:
+        by_package[entry['module'].split('.')[0]] += entry['self_us']
+    return {
+        'total_ms': sum(e['self_us'] for e in entries) / 1000,
+        'modules': len(entries),
+        'slowest_modules': sorted(entries, key=lambda e: e['cumulative_us'], reverse=True)[:top],
+        'slowest_packages': [{'package': p, 'self_ms': us / 1000} for p, us in by_package.most_common(top)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('module', nargs='?', default='main')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print the summary as JSON for tracking over time')
+    args = parser.parse_args()
+
+    report = summarise(measure(args.module), args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"import {args.module}: {report['total_ms']:.1f} ms across {report['modules']} modules\n")
+    print("Slowest modules (cumulative):")
+    for entry in report['slowest_modules']:
+        print(f"  {entry['cumulative_us'] / 1000:9.1f} ms  {entry['module']}")
+    print("\nSlowest top-level packages (self):")
+    for entry in report['slowest_packages']:
+        print(f"  {entry['self_ms']:9.1f} ms  {entry['package']}")
+
+
+if __name__ == '__main__':
+    main()
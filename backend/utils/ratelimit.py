@@ -0,0 +1,51 @@
+import time
+import asyncio
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`.
+
+    `consume()` may push the level below zero (e.g. when the real cost of a call
+    turns out higher than estimated); callers then simply wait longer next time.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    @classmethod
+    def per_minute(cls, amount: float):
+        return cls(rate=amount / 60, capacity=amount)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def wait_time(self, amount: float = 1) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        self._refill()
+        # Requests bigger than the bucket only need it full
+        missing = min(amount, self.capacity) - self._tokens
+        return max(0.0, missing / self.rate) if self.rate else float('inf')
+
+    def consume(self, amount: float = 1):
+        self._refill()
+        self._tokens -= amount
+
+    def try_acquire(self, amount: float = 1) -> bool:
+        if self.wait_time(amount) > 0:
+            return False
+        self._tokens -= amount
+        return True
+
+    async def acquire(self, amount: float = 1):
+        while not self.try_acquire(amount):
+            await asyncio.sleep(self.wait_time(amount))
@@ -0,0 +1,31 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one in-flight task.
+
+    The first caller for a key starts the work; anyone asking for the same key
+    while it runs awaits the same task and gets the same result (or exception).
+    The key is forgotten as soon as the task finishes, so nothing is cached.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+        self.stats = {'calls': 0, 'shared': 0}
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs):
+        task = self._calls.get(key)
+        if task is None:
+            self.stats['calls'] += 1
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.stats['shared'] += 1
+        # One caller giving up must not cancel the work the others are waiting on
+        return await asyncio.shield(task)
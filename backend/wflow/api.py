@@ -9,6 +9,10 @@ from utils.tokenizer import invoke_uid
 from fastapi import Depends
 
 from wflow.wflow import WorkflowExecutor
+from wflow.plan import PlanError, get_plan
+from responses import StandardException
+from triggers.telegram_trigger import telegram_triggers
+from triggers.whatsapp_trigger import whatsapp_triggers
 
 wflow_router = APIRouter(prefix='/wflow')
 
@@ -23,6 +27,8 @@ async def list_workflows(user: User = Depends(get_user)):
 async def create_wflow(wflow_payload: WFlowPayload, user: User = Depends(get_user), ):
     wflow_data = WFlow(**wflow_payload.model_dump(), wflow_id=invoke_uid(prefix='wfl'), user_id=user.user_id)
     await Var.db.create_wflow(wflow_data)
+    telegram_triggers.update_workflow(wflow_data)
+    whatsapp_triggers.update_workflow(wflow_data)
     return wflow_data
 
 
@@ -35,18 +41,30 @@ async def get_wflow(wflow_id, _user: User = Depends(get_user)):
 @wflow_router.put('/{wflow_id}')
 async def update_wflow(wflow_id: str, wflow_payload: WFlowPayload, _user: User = Depends(get_user)):
     await Var.db.set_wflow(wflow_id, wflow_payload)
+    wflow_data = await Var.db.get_wflow(wflow_id)
+    telegram_triggers.update_workflow(wflow_data)
+    whatsapp_triggers.update_workflow(wflow_data)
 
 
 @wflow_router.put('/{wflow_id}')
 async def update_wflow(wflow_id: str, wflow_payload: WFlowPayload, _user: User = Depends(get_user)):
     await Var.db.set_wflow(wflow_id, wflow_payload)
+    wflow_data = await Var.db.get_wflow(wflow_id)
+    telegram_triggers.update_workflow(wflow_data)
+    whatsapp_triggers.update_workflow(wflow_data)
 
 
 @wflow_router.post('/{wflow_id}/execute')
 async def execute_wflow(wflow_id: str, wflow_payload: WFlowPayload, _user: User = Depends(get_user)):
     await Var.db.set_wflow(wflow_id, wflow_payload)
     wflow_data = await Var.db.get_wflow(wflow_id)
-    executor = WorkflowExecutor(workflow=wflow_data)
+    telegram_triggers.update_workflow(wflow_data)
+    whatsapp_triggers.update_workflow(wflow_data)
+    try:
+        plan = get_plan(wflow_data)
+    except PlanError as e:
+        raise StandardException(status_code=422, details=e.problems, message='invalid workflow')
+    executor = WorkflowExecutor(workflow=wflow_data, plan=plan)
     await executor.execute("create a cute cat")
 
 
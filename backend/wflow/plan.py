@@ -0,0 +1,197 @@
+import json
+import hashlib
+import collections
+
+from wflow.schemas import WFlow
+from agents.pool import agent_pool_key
+from agents.image_agent.image_agent import ImageAgent
+from agents.whatsapp_agent.whatsapp_agent import WhatsappAgent
+from agents.telegram_agent.telegram_agent import TelegramAgent
+from agents.blockchain_agent.blockchain_agent import BlockchainAgent
+
+AGENT_CLASS_MAP = {
+    "ImageAgent": ImageAgent,
+    "WhatsappAgent": WhatsappAgent,
+    "TelegramAgent": TelegramAgent,
+    'BlockchainAgent': BlockchainAgent
+}
+
+TRIGGER_CLASSES = {"ManualTrigger", "WhatsappTrigger", "TelegramTrigger", "WebchatTrigger"}
+
+
+class PlanError(ValueError):
+    def __init__(self, wflow_id: str, problems: list[str]):
+        super().__init__(f"Invalid workflow {wflow_id}: " + "; ".join(problems))
+        self.wflow_id = wflow_id
+        self.problems = problems
+
+
+class ExecutionPlan:
+    """Validated, index-based form of a WFlow that executions can share.
+
+    Nodes are addressed by their position in `nodes`; `parents`/`children` hold
+    indices, and `pending[trigger]` is the initial number of parents each node
+    waits on when the run starts from that trigger (-1 = not part of that run).
+    """
+
+    def __init__(self, wflow_id, content_hash, nodes, agent_classes, agent_keys, tool_funcs, parents, children,
+                 triggers, pending, warnings=()):
+        self.wflow_id = wflow_id
+        self.content_hash = content_hash
+        self.nodes = nodes
+        self.agent_classes = agent_classes
+        self.agent_keys = agent_keys
+        self.tool_funcs = tool_funcs
+        self.parents = parents
+        self.children = children
+        self.triggers = triggers
+        self.pending = pending
+        # Problems that don't stop the workflow from running, e.g. unknown tools that were left out
+        self.warnings = warnings
+        self.index = {node.node_id: i for i, node in enumerate(nodes)}
+
+
+def content_hash(wflow: WFlow) -> str:
+    # Canvas positions don't change how a workflow runs, so moving nodes around keeps the plan
+    payload = wflow.model_dump(include={'nodes', 'connections'}, exclude={'nodes': {'__all__': {'position'}}})
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def compile_plan(wflow: WFlow, wflow_hash: str = None) -> ExecutionPlan:
+    """Checks the workflow graph once and builds its ExecutionPlan, raising PlanError on any graph problem."""
+    problems, warnings = [], []
+    nodes = tuple(wflow.nodes)
+    index = {}
+    for i, node in enumerate(nodes):
+        if node.node_id in index:
+            problems.append(f"duplicate node_id '{node.node_id}'")
+        index[node.node_id] = i
+
+    # Node classes and the tools they enable
+    agent_classes, tool_funcs = [], []
+    for node in nodes:
+        enabled = tuple(tool.tool_func for tool in node.tools if tool.active)
+        agent_class = None
+        if node.type == 'trigger':
+            if node.node_class not in TRIGGER_CLASSES:
+                problems.append(f"unknown trigger class '{node.node_class}' on node '{node.node_id}'")
+        else:
+            agent_class = AGENT_CLASS_MAP.get(node.node_class)
+            if not agent_class:
+                problems.append(f"unknown node_class '{node.node_class}' on node '{node.node_id}'")
+            else:
+                # Unknown tools (e.g. ones the editor offers but the agent dropped) are skipped, not fatal
+                for tool_func in enabled:
+                    if tool_func not in agent_class.tool_funcs:
+                        warnings.append(f"tool '{tool_func}' not found on agent '{node.node_class}' "
+                                        f"(node '{node.node_id}'), skipping it")
+                enabled = tuple(tool_func for tool_func in enabled if tool_func in agent_class.tool_funcs)
+        agent_classes.append(agent_class)
+        tool_funcs.append(enabled)
+
+    # Connections, skipping duplicates of the same edge
+    parents = [[] for _ in nodes]
+    children = [[] for _ in nodes]
+    for conn in wflow.connections:
+        dangling = [end for end in (conn.from_node, conn.to_node) if end not in index]
+        if dangling:
+            problems.append(f"connection '{conn.conn_id}' points to missing node(s) {', '.join(dangling)}")
+            continue
+        src, dst = index[conn.from_node], index[conn.to_node]
+        if nodes[dst].type == 'trigger':
+            problems.append(f"connection '{conn.conn_id}' leads into trigger '{conn.to_node}'")
+        if dst not in children[src]:
+            children[src].append(dst)
+            parents[dst].append(src)
+
+    triggers = tuple(i for i, node in enumerate(nodes) if node.type == 'trigger')
+    if not triggers:
+        problems.append("no trigger node found")
+
+    # Cycles: whatever Kahn's algorithm can't peel off sits on or behind a cycle
+    in_degree = [len(p) for p in parents]
+    queue = collections.deque(i for i, d in enumerate(in_degree) if d == 0)
+    visited = 0
+    while queue:
+        i = queue.popleft()
+        visited += 1
+        for child in children[i]:
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                queue.append(child)
+    if visited != len(nodes):
+        cyclic = [nodes[i].node_id for i, d in enumerate(in_degree) if d > 0]
+        problems.append(f"cycle through node(s) {', '.join(cyclic)}")
+
+    # Readiness counts per trigger, restricted to the nodes that trigger reaches
+    pending = {}
+    reached = set()
+    for trigger in triggers:
+        reachable = {trigger}
+        stack = [trigger]
+        while stack:
+            for child in children[stack.pop()]:
+                if child not in reachable:
+                    reachable.add(child)
+                    stack.append(child)
+        reached |= reachable
+        pending[trigger] = tuple(
+            sum(1 for p in parents[i] if p in reachable) if i in reachable else -1 for i in range(len(nodes))
+        )
+    unreachable = [node.node_id for i, node in enumerate(nodes) if i not in reached]
+    if triggers and unreachable:
+        problems.append(f"node(s) not reachable from any trigger: {', '.join(unreachable)}")
+
+    if problems:
+        raise PlanError(wflow.wflow_id, problems)
+    for warning in warnings:
+        print(f"Warning: workflow {wflow.wflow_id}: {warning}")
+
+    return ExecutionPlan(
+        wflow_id=wflow.wflow_id,
+        content_hash=wflow_hash or content_hash(wflow),
+        nodes=nodes,
+        agent_classes=tuple(agent_classes),
+        agent_keys=tuple(agent_pool_key(node.node_class, node.creds, tool_funcs[i]) if agent_classes[i] else None
+                         for i, node in enumerate(nodes)),
+        tool_funcs=tuple(tool_funcs),
+        parents=tuple(tuple(p) for p in parents),
+        children=tuple(tuple(c) for c in children),
+        triggers=triggers,
+        pending=pending,
+        warnings=tuple(warnings),
+    )
+
+
+class PlanCache:
+    """LRU of compiled plans keyed by (wflow_id, content hash)."""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._plans = collections.OrderedDict()
+
+    def get(self, wflow: WFlow) -> ExecutionPlan:
+        key = (wflow.wflow_id, content_hash(wflow))
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+            return plan
+
+        plan = compile_plan(wflow, wflow_hash=key[1])
+        # A new version replaces whatever was cached for the same workflow
+        for stale in [k for k in self._plans if k[0] == wflow.wflow_id]:
+            del self._plans[stale]
+        self._plans[key] = plan
+        while len(self._plans) > self.max_size:
+            self._plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        self._plans.clear()
+
+
+plan_cache = PlanCache()
+
+
+def get_plan(wflow: WFlow) -> ExecutionPlan:
+    return plan_cache.get(wflow)
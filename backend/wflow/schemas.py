@@ -19,6 +19,8 @@ class Node(BaseModel):
     position: dict[str, float]
     tools: list[Tool]
     creds: list[dict[str, Optional[str]]]
+    # Set to False to keep this node's LLM calls out of the response cache
+    llm_cache: bool = True
 
 
 class Conn(BaseModel):
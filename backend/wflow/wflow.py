@@ -1,104 +1,108 @@
 import asyncio
-import collections
 
 from globar_vars import Var
 from wflow.schemas import WFlow, sample_workflow, WorkFlowStatus
-from agents.image_agent.image_agent import ImageAgent
-from agents.whatsapp_agent.whatsapp_agent import WhatsappAgent
-from agents.telegram_agent.telegram_agent import TelegramAgent
-from agents.blockchain_agent.blockchain_agent import BlockchainAgent
+from wflow.plan import ExecutionPlan, get_plan
+from agents.pool import agent_pool
+from agents.llm_cache import llm_cache_enabled
+from utils.singleflight import SingleFlight
 
-AGENT_CLASS_MAP = {
-    "ImageAgent": ImageAgent,
-    "WhatsappAgent": WhatsappAgent,
-    "TelegramAgent": TelegramAgent,
-    'BlockchainAgent': BlockchainAgent
-}
+# Shared by all executors so concurrent identical runs of side-effect-free nodes are collapsed
+agent_runs = SingleFlight()
 
 
 class WorkflowExecutor:
-    def __init__(self, workflow: WFlow):
+    def __init__(self, workflow: WFlow, plan: ExecutionPlan = None):
         self.workflow = workflow
-        # Create a quick lookup map for nodes by their ID
-        self.node_map = {node.node_id: node for node in self.workflow.nodes}
-        # Create an adjacency list to represent the graph's connections
-        self.adjacency_list = collections.defaultdict(list)
-        for conn in self.workflow.connections:
-            self.adjacency_list[conn.from_node].append(conn.to_node)
-
+        # The compiled plan already holds the validated graph as index lists,
+        # so nothing is rebuilt per execution
+        self.plan = plan or get_plan(workflow)
         self.execution_results = {}
 
-    async def _execute_node(self, node_id: str, input_data: str):
-        """Dynamically instantiates and runs a single agent node."""
-        node_config = self.node_map[node_id]
-
-        # 1. Find the correct agent class from the map
-        agent_class = AGENT_CLASS_MAP.get(node_config.node_class)
-        if not agent_class:
-            raise ValueError(f"Unknown node_class: {node_config.node_class}")
-
-        # 2. Instantiate the agent
-        agent_instance = agent_class(node_config.creds)
-
-        # 3. Configure tools dynamically based on the workflow definition
-        enabled_tools = []
-        for tool_configs in node_config.tools:
-            tool_func = tool_configs.tool_func
-            is_enabled = tool_configs.active
+    async def _run_agent(self, index: int, query: str):
+        node_config = self.plan.nodes[index]
+        # Runs in its own task, so the cache opt-out stays local to this node
+        llm_cache_enabled.set(node_config.llm_cache)
+        async with agent_pool.borrow(self.plan.agent_keys[index], self.plan.agent_classes[index],
+                                     node_config.creds, self.plan.tool_funcs[index]) as agent_instance:
+            return await agent_instance.run(query=query)
 
-            if is_enabled:
-                if hasattr(agent_instance.struct_tools, tool_func):
-                    enabled_tools.append(getattr(agent_instance.struct_tools, tool_func))
-                else:
-                    print(f"Warning: Tool '{tool_func}' not found on agent '{node_config.node_class}'")
-        agent_instance.tools = enabled_tools
+    async def _execute_node(self, index: int, input_data: str):
+        """Borrows a warm agent for the node from the pool and runs it."""
+        node_config = self.plan.nodes[index]
 
-        # 4. Construct the query for the agent
+        # 1. Construct the query for the agent
         # We combine the output from the previous step with the node's specific purpose.
         query = f"previous step: '{input_data}'\n\nYour task: {node_config.purpose}"
 
-        # 5. Run the agent and store its result
-        result = await agent_instance.run(query=query)
-        self.execution_results[node_id] = result
+        # 2. Run a pooled agent built from the node's class, creds and enabled tools.
+        # For agents without side effects, the same node's identical runs already in
+        # flight (e.g. a burst of the same trigger message) share that run's result.
+        # Agents that send messages or transactions opt out: every run must act.
+        if getattr(self.plan.agent_classes[index], 'dedupe_runs', False):
+            flight_key = (self.plan.agent_keys[index], node_config.node_id, node_config.llm_cache, query)
+            result = await agent_runs.do(flight_key, self._run_agent, index, query)
+        else:
+            result = await self._run_agent(index, query)
+
+        # 3. Store its result
+        self.execution_results[node_config.node_id] = result
         return result
 
-    async def execute(self, initial_input: str):
-        """Executes the entire workflow starting from the trigger."""
-        # Find the trigger node
-        trigger_node = next((n for n in self.workflow.nodes if n.type == 'trigger'), None)
-        if not trigger_node:
-            raise ValueError("No trigger node found in workflow")
+    def _collect_input(self, index: int):
+        """Builds the input for a node from the results of all of its parents."""
+        parents = [self.plan.nodes[p].node_id for p in self.plan.parents[index]
+                   if self.plan.nodes[p].node_id in self.execution_results]
+        if len(parents) == 1:
+            return self.execution_results[parents[0]]
+        # Fan-in: hand the node every parent's output, labelled by parent
+        return "\n".join(f"{parent_id}: {self.execution_results[parent_id]}" for parent_id in parents)
+
+    async def execute(self, initial_input: str, trigger_id: str = None):
+        """Executes the entire workflow starting from the trigger.
+
+        Nodes are scheduled by dependency count: a node starts as soon as all of
+        its parents have finished, independently of unrelated branches, and runs
+        exactly once.
+        """
+        plan = self.plan
+        # Start from the requested trigger, or the first one in the workflow
+        trigger = plan.index.get(trigger_id) if trigger_id else plan.triggers[0]
+        if trigger is None:
+            raise ValueError(f"Node {trigger_id} is not in the workflow")
+        if trigger not in plan.pending:
+            raise ValueError(f"Node {trigger_id} is not a trigger")
 
         print(f"--- Starting Workflow Execution ---")
-        print(f"Trigger: {trigger_node.node_id}")
+        print(f"Trigger: {plan.nodes[trigger].node_id}")
         print(f"Initial Input: {initial_input}\n")
 
         # The "result" of the trigger is the initial input
-        self.execution_results[trigger_node.node_id] = initial_input
-
-        # Get the first layer of nodes to process (nodes connected to the trigger)
-        nodes_to_process = self.adjacency_list.get(trigger_node.node_id, [])
-
-        # Process the graph layer by layer
-        while nodes_to_process:
-            tasks = []
-            # For each node in the current layer, find its predecessor to get the correct input
-            for node_id in nodes_to_process:
-                # This assumes a simple linear chain or fan-out structure.
-                # For fan-in, this logic would need to be more complex.
-                predecessor_id = next(c.from_node for c in self.workflow.connections if c.to_node == node_id)
-                input_data = self.execution_results[predecessor_id]
-                tasks.append(self._execute_node(node_id, input_data))
-
-            # Run all nodes in the current layer concurrently
-            await asyncio.gather(*tasks)
-
-            # Find the next layer of nodes to process
-            next_layer = []
-            for node_id in nodes_to_process:
-                next_layer.extend(self.adjacency_list.get(node_id, []))
-
-            nodes_to_process = next_layer
+        self.execution_results[plan.nodes[trigger].node_id] = initial_input
+
+        remaining = list(plan.pending[trigger])
+        running = {}
+
+        def release_children(index: int):
+            for child in plan.children[index]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    task = asyncio.create_task(self._execute_node(child, self._collect_input(child)))
+                    running[task] = child
+
+        release_children(trigger)
+
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = running.pop(task)
+                    # Re-raise node failures just like asyncio.gather did
+                    task.result()
+                    release_children(index)
+        finally:
+            for task in running:
+                task.cancel()
 
         print("--- Workflow Execution Finished ---")
         return self.execution_results